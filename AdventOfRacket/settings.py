@@ -18,11 +18,15 @@ import os
 # Load environment variables from .env file
 load_dotenv()
 
-from mongoengine import connect
+from mongoengine import register_connection
+from application import mongo_stats
 
-connect(
+# the client is only created on the first query (or by the warm-up in gunicorn.conf.py), not while booting
+register_connection(
+    "default",
     db=os.getenv("MONGODB_NAME"),
     host=os.getenv("MONGODB_URI"),
+    event_listeners=[mongo_stats.listener],
 )
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -50,6 +54,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'application.middleware.timing_middleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -0,0 +1,116 @@
+import fcntl
+import json
+import os
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from . import metrics
+
+# judge admission shared by every server process on the machine: submissions take a ticket when they are
+# accepted and hold one of JUDGE_SLOTS while racket runs, the tickets live in one JSON file kept under flock
+JUDGE_SLOTS = int(os.getenv("JUDGE_SLOTS", os.cpu_count() or 1)) # judge runs at once across all processes, 0 disables admission control
+JUDGE_QUEUE_LIMIT = int(os.getenv("JUDGE_QUEUE_LIMIT", 32)) # accepted submissions allowed to wait for a slot
+RETRY_AFTER = int(os.getenv("JUDGE_RETRY_AFTER", 10)) # seconds a turned away client is asked to wait
+STATE_FILE = Path(os.getenv("JUDGE_ADMISSION_FILE", Path(tempfile.gettempdir()) / "adventofracket-judge.json"))
+POLL_INTERVAL = 0.1 # seconds between checks for a free slot
+
+class Overloaded(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"The judge is busy, please try again in {retry_after} seconds")
+        self.retry_after = retry_after
+
+def _alive(ticket):
+    try:
+        os.kill(int(ticket.split(":")[0]), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+@contextmanager
+def _state():
+    # yields {"waiting": [...], "running": [...]} of ticket ids and writes it back, holding the file's lock meanwhile.
+    # tickets of processes that died (e.g. a worker killed on timeout) are dropped so their slots aren't lost
+    fd = os.open(STATE_FILE, os.O_RDWR | os.O_CREAT, 0o600)
+    with os.fdopen(fd, "r+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            state = json.loads(f.read() or "{}")
+        except ValueError:
+            state = {}
+        state = {key: [ticket for ticket in state.get(key, []) if _alive(ticket)] for key in ("waiting", "running")}
+        yield state
+        f.seek(0)
+        f.truncate()
+        json.dump(state, f)
+
+def _refuse_if_full(state):
+    if len(state["waiting"]) >= JUDGE_QUEUE_LIMIT:
+        metrics.ADMISSION_REJECTED.inc()
+        raise Overloaded(RETRY_AFTER)
+
+def check():
+    # raises Overloaded when the queue is full, without taking a ticket
+    if JUDGE_SLOTS <= 0:
+        return
+    with _state() as state:
+        _refuse_if_full(state)
+
+def admit():
+    # returns a ticket for a new submission, None when admission control is off, raises Overloaded when the queue is full.
+    # slots go to tickets in the order they were admitted, so take them in the order the jobs will run (see jobs.enqueue)
+    if JUDGE_SLOTS <= 0:
+        return None
+    ticket = f"{os.getpid()}:{uuid.uuid4().hex}"
+    with _state() as state:
+        _refuse_if_full(state)
+        state["waiting"].append(ticket)
+    return ticket
+
+def release(ticket):
+    # gives up a ticket, whether it is still waiting or already running
+    if ticket is None:
+        return
+    with _state() as state:
+        for key in ("waiting", "running"):
+            if ticket in state[key]:
+                state[key].remove(ticket)
+
+def _try_start(ticket):
+    with _state() as state:
+        if ticket not in state["waiting"]:
+            # the state file was removed from under us, queue up again
+            state["waiting"].append(ticket)
+        free = JUDGE_SLOTS - len(state["running"])
+        # first come, first served across processes
+        if ticket not in state["waiting"][:max(free, 0)]:
+            return False
+        state["waiting"].remove(ticket)
+        state["running"].append(ticket)
+        return True
+
+@contextmanager
+def running(ticket):
+    # waits for a judge slot, holds it while the block runs and releases the ticket afterwards
+    if ticket is None:
+        yield
+        return
+    try:
+        while not _try_start(ticket):
+            time.sleep(POLL_INTERVAL)
+        yield
+    finally:
+        release(ticket)
+
+def stats():
+    if JUDGE_SLOTS <= 0:
+        return {"running": 0, "waiting": 0}
+    with _state() as state:
+        return {"running": len(state["running"]), "waiting": len(state["waiting"])}
+
+metrics.Gauge("aor_judge_slots_in_use", "Judge slots in use across all server processes", lambda: stats()["running"])
+metrics.Gauge("aor_judge_admission_waiting", "Accepted submissions waiting for a judge slot across all server processes", lambda: stats()["waiting"])
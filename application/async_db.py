@@ -0,0 +1,34 @@
+import asyncio
+import os
+import weakref
+
+from mongoengine.connection import get_db
+from pymongo import AsyncMongoClient
+
+from . import mongo_stats
+
+# async clients are tied to the event loop they were first used on. Under ASGI there is one loop per
+# process and so one client, a WSGI server (e.g. runserver) runs each async view on a fresh loop
+_clients = weakref.WeakKeyDictionary() # loop -> (client, the generator that closes it)
+
+async def _closing(client):
+    # asyncio.run, which asgiref uses for each of those fresh loops, closes the async generators still
+    # open on a loop before closing the loop, and with it the client
+    try:
+        yield
+    finally:
+        await client.close()
+
+def get_client():
+    loop = asyncio.get_running_loop()
+    entry = _clients.get(loop)
+    if entry is None:
+        client = AsyncMongoClient(os.getenv("MONGODB_URI"), event_listeners=[mongo_stats.listener])
+        closer = _closing(client)
+        asyncio.ensure_future(anext(closer))
+        entry = _clients[loop] = (client, closer)
+    return entry[0]
+
+def collection(model):
+    # the same collection mongoengine uses for the model, documents come back as plain dicts
+    return get_client()[get_db().name][model._get_collection_name()]
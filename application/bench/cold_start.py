@@ -0,0 +1,54 @@
+# Boots the ASGI application in a fresh interpreter and sends it one request, for `manage.py profile_startup`.
+# Prints {"boot_ms", "first_response_ms", "status"} as one JSON line, timed from the start of this script.
+import asyncio
+import json
+import os
+import sys
+import time
+
+start = time.perf_counter()
+
+async def first_response(application, path):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode("utf-8"),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 0),
+        "server": ("localhost", 80),
+    }
+    body = [{"type": "http.request", "body": b"", "more_body": False}]
+    response = {}
+
+    async def receive():
+        if body:
+            return body.pop()
+        await asyncio.Future() # the client never disconnects
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+
+    await application(scope, receive, send)
+    return response.get("status")
+
+def main(path):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "AdventOfRacket.settings")
+    from AdventOfRacket.asgi import application
+    booted = time.perf_counter()
+    status = asyncio.run(first_response(application, path))
+    responded = time.perf_counter()
+    print(json.dumps({
+        "boot_ms": round((booted - start) * 1000, 1),
+        "first_response_ms": round((responded - start) * 1000, 1),
+        "status": status,
+    }), flush=True)
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else "/")
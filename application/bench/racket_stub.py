@@ -0,0 +1,23 @@
+# Stand-in for application/racket/worker.rkt used by `manage.py bench`. It speaks the same JSON lines
+# protocol and answers every test with 0 after a fixed delay, so judge timings only depend on the app.
+import json
+import os
+import sys
+import time
+
+DELAY = float(os.getenv("BENCH_RACKET_DELAY", 0.005)) # seconds per test
+
+def emit(record):
+    sys.stdout.write(json.dumps(record) + "\n")
+    sys.stdout.flush()
+
+def main():
+    for line in sys.stdin:
+        job = json.loads(line)
+        for _ in job["tests"]:
+            time.sleep(DELAY)
+            emit({"output": "0\n", "time_ms": DELAY * 1000, "cpu_ms": 0, "memory": None})
+        emit({"done": True})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import json
+import stat
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+PUBLIC_TESTS = 5
+HIDDEN_TESTS = 20
+
+def problem_resources(day, part):
+    # every test expects 0, which is what the racket stub answers, so each first submission solves the problem
+    tests = {
+        "function_name": "solve",
+        "public": [[str(i), "0"] for i in range(PUBLIC_TESTS)],
+        "hidden": [[str(i), "0"] for i in range(PUBLIC_TESTS, PUBLIC_TESTS + HIDDEN_TESTS)],
+    }
+    return {
+        "tests": json.dumps(tests),
+        "starter": "#lang racket\n\n(define (solve n)\n  0)\n",
+        "md": f"# Day {day}, part {part}\n\nBenchmark problem.\n" + "Lorem ipsum dolor sit amet. " * 200,
+    }
+
+class ProblemManagerStub:
+    # a local Problem Manager API serving /<resource>/<day>/<part> with a fixed latency and ETags, counting hits
+    def __init__(self, latency=0.02):
+        self.latency = latency
+        self.hits = Counter()
+        self._server = None
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                try:
+                    resource, day, part = self.path.strip("/").split("/")
+                    body = problem_resources(int(day), int(part))[resource].encode("utf-8")
+                except (ValueError, KeyError):
+                    self.send_error(404)
+                    return
+                stub.hits[resource] += 1
+                time.sleep(stub.latency)
+                etag = f'"{resource}-{day}-{part}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+def make_racket_root(directory):
+    # lays out <directory>/bin/racket so racket_pool starts the python stub instead of racket
+    stub = Path(__file__).resolve().parent / "racket_stub.py"
+    racket = Path(directory) / "bin" / "racket"
+    racket.parent.mkdir(parents=True, exist_ok=True)
+    racket.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{stub}"\n')
+    racket.chmod(racket.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return Path(directory)
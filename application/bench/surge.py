@@ -0,0 +1,145 @@
+import asyncio
+import json
+import math
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.test import AsyncClient
+
+from application import mongo_stats
+
+_http_calls = ContextVar("bench_http_calls", default=None)
+
+def count_http(response, *args, **kwargs):
+    # requests response hook, counts Problem Manager calls against the request being measured
+    calls = _http_calls.get()
+    if calls is not None:
+        calls.count += 1
+
+class Sample:
+    def __init__(self, endpoint, latency, status, mongo_calls, http_calls):
+        self.endpoint = endpoint
+        self.latency = latency
+        self.status = status
+        self.mongo_calls = mongo_calls
+        self.http_calls = http_calls
+
+class Surge:
+    # every user opens the calendar, the new problem, submits, polls for the result and checks the leaderboards,
+    # arriving at seeded random offsets within `ramp` seconds of the unlock
+    def __init__(self, users, ramp, day, part, seed=0, poll_interval=0.5):
+        self.users = users
+        self.ramp = ramp
+        self.day = day
+        self.part = part
+        self.poll_interval = poll_interval
+        self.arrivals = sorted(random.Random(seed).uniform(0, ramp) for _ in range(users))
+        self.samples = []
+        self.judge_times = []
+        self.wall_time = 0
+
+    def run(self):
+        asyncio.run(self._run())
+
+    async def _run(self):
+        start = time.perf_counter()
+        await asyncio.gather(*(self._user(user_id, start + arrival) for user_id, arrival in enumerate(self.arrivals, 1)))
+        self.wall_time = time.perf_counter() - start
+
+    def _client(self, user_id):
+        client = AsyncClient(headers={"host": "localhost"})
+        session = client.session
+        session["user_id"] = str(user_id)
+        session["username"] = f"bench-{user_id}"
+        session.save()
+        client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+        return client
+
+    async def _request(self, client, endpoint, method, path, **kwargs):
+        http = mongo_stats.RoundTrips()
+        token = _http_calls.set(http)
+        try:
+            with mongo_stats.count_round_trips() as trips:
+                started = time.perf_counter()
+                response = await getattr(client, method)(path, **kwargs)
+                latency = time.perf_counter() - started
+        finally:
+            _http_calls.reset(token)
+        self.samples.append(Sample(endpoint, latency, response.status_code, trips.count, http.count))
+        return response
+
+    async def _user(self, user_id, arrives_at):
+        await asyncio.sleep(max(0, arrives_at - time.perf_counter()))
+        client = self._client(user_id)
+        problem_path = f"/problem/{self.day}/{self.part}"
+
+        await self._request(client, "index", "get", "/")
+        await self._request(client, "problem", "get", problem_path)
+
+        # the comment keeps every submission distinct, so the judge cache doesn't answer for the surge
+        code = f"#lang racket\n\n(define (solve n)\n  0) ; {user_id}\n"
+        submitted = time.perf_counter()
+        response = await self._request(client, "submit", "post", f"{problem_path}/submit", data=json.dumps({"code": code}), content_type="application/json")
+        job_id = response.json().get("job_id") if response.status_code == 202 else None
+        while job_id:
+            await asyncio.sleep(self.poll_interval)
+            status = (await self._request(client, "submission_status", "get", f"{problem_path}/submit/{job_id}")).json()
+            if status.get("status") not in ("queued", "running"):
+                self.judge_times.append(time.perf_counter() - submitted)
+                break
+
+        await self._request(client, "leaderboard_day", "get", f"/leaderboard/{self.day}")
+        await self._request(client, "leaderboard", "get", "/leaderboard")
+
+def percentile(values, p):
+    # nearest rank, so the same samples always give the same answer
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+def report(surge, config):
+    endpoints = {}
+    for endpoint in dict.fromkeys(sample.endpoint for sample in surge.samples):
+        samples = [sample for sample in surge.samples if sample.endpoint == endpoint]
+        latencies = [sample.latency for sample in samples]
+        endpoints[endpoint] = {
+            "requests": len(samples),
+            "errors": sum(1 for sample in samples if sample.status >= 400),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+            "mongo_calls": round(sum(sample.mongo_calls for sample in samples) / len(samples), 2),
+            "http_calls": round(sum(sample.http_calls for sample in samples) / len(samples), 2),
+        }
+    return {
+        "config": config,
+        "wall_time": round(surge.wall_time, 3),
+        "throughput": round(len(surge.samples) / surge.wall_time, 2) if surge.wall_time else 0,
+        "endpoints": endpoints,
+        "judge": {
+            "submissions": len(surge.judge_times),
+            "p50_ms": round(percentile(surge.judge_times, 50) * 1000, 2),
+            "p99_ms": round(percentile(surge.judge_times, 99) * 1000, 2),
+        },
+    }
+
+def compare(current, baseline, tolerance):
+    # latency and throughput may drift by `tolerance` percent, call counts are deterministic and may not grow
+    regressions = []
+    slack = 1 + tolerance / 100
+    if current["throughput"] * slack < baseline["throughput"]:
+        regressions.append(f"throughput {baseline['throughput']} -> {current['throughput']} req/s")
+    for endpoint, stats in current["endpoints"].items():
+        before = baseline["endpoints"].get(endpoint)
+        if not before:
+            continue
+        for metric in ("p50_ms", "p99_ms"):
+            if stats[metric] > before[metric] * slack:
+                regressions.append(f"{endpoint} {metric} {before[metric]} -> {stats[metric]}")
+        for metric in ("mongo_calls", "http_calls"):
+            if stats[metric] > before[metric] + 0.01:
+                regressions.append(f"{endpoint} {metric} {before[metric]} -> {stats[metric]}")
+    return regressions
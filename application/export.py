@@ -0,0 +1,115 @@
+import csv
+import json
+
+from .leaderboards import BOARDS, DAYS, compute_overall
+from .models import User, Problem, DayLeaderboard
+
+# Standings and submissions for organizers, read through batched cursors and written out row by row,
+# so memory stays flat however many problems there are. Used by `manage.py export` and the /export view.
+
+BATCH_SIZE = 500
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+CHUNK_SIZE = 64 * 1024 # characters per chunk handed to the response
+
+PROBLEM_FIELDS = ("id", "player", "day", "part", "correct", "time_taken", "total_time", "time_started", "last_submission_time", "tests_message")
+DAY_FIELDS = ("day", "part", "rank", "player", "name", "link", "time")
+OVERALL_FIELDS = ("rank", "name", "link", "score")
+
+def batches(cursor, size):
+    batch = []
+    for document in cursor:
+        batch.append(document)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def problem_rows(day=None, part=None, batch_size=BATCH_SIZE):
+    query = {}
+    if day:
+        query["day"] = day
+    if part:
+        query["part"] = part
+    projection = {field: 1 for field in PROBLEM_FIELDS if field != "id"}
+    cursor = Problem._get_collection().find(query, projection).sort("_id", 1).batch_size(batch_size)
+    try:
+        for problem in cursor:
+            problem["id"] = str(problem.pop("_id"))
+            yield problem
+    finally:
+        cursor.close()
+
+def day_rows(day=None, part=None, batch_size=BATCH_SIZE):
+    # every solve of a day ranked by time, not just the stored top ten, with one $in user lookup per batch
+    for board_day in [day] if day else DAYS:
+        for board_part in [part] if part else BOARDS:
+            sort_field = "time_taken" if board_part == 1 else "total_time"
+            cursor = (Problem._get_collection()
+                .find({"day": board_day, "part": board_part, "correct": True}, {"player": 1, sort_field: 1})
+                .sort(sort_field, 1)
+                .batch_size(batch_size))
+            rank = 0
+            try:
+                for batch in batches(cursor, batch_size):
+                    # Problem.player holds the github id as a string, User.github_id is an int
+                    users = {
+                        user["github_id"]: user
+                        for user in User._get_collection().find({"github_id": {"$in": [int(problem["player"]) for problem in batch]}}, {"github_id": 1, "username": 1, "url": 1})
+                    }
+                    for problem in batch:
+                        rank += 1
+                        user = users.get(int(problem["player"]), {})
+                        yield {
+                            "day": board_day,
+                            "part": board_part,
+                            "rank": rank,
+                            "player": problem["player"],
+                            "name": user.get("username"),
+                            "link": user.get("url"),
+                            "time": problem.get(sort_field),
+                        }
+            finally:
+                cursor.close()
+
+def overall_rows(day=None, part=None, batch_size=BATCH_SIZE):
+    # scores come from the stored day boards, at most 25 days * 2 boards * 10 entries
+    day_boards = DayLeaderboard._get_collection().find({}, {"day": 1, "one_star": 1, "two_stars": 1})
+    for rank, entry in enumerate(compute_overall(day_boards, size=None), 1):
+        yield {"rank": rank, **entry}
+
+DATASETS = {
+    "problems": (PROBLEM_FIELDS, problem_rows),
+    "day": (DAY_FIELDS, day_rows),
+    "overall": (OVERALL_FIELDS, overall_rows),
+}
+
+class Echo:
+    # csv writers write to this and get the formatted row back
+    def write(self, value):
+        return value
+
+def lines(dataset, format, day=None, part=None):
+    fields, rows = DATASETS[dataset]
+    if format == "csv":
+        writer = csv.DictWriter(Echo(), fieldnames=fields, extrasaction="ignore")
+        yield writer.writeheader()
+        for row in rows(day, part):
+            yield writer.writerow(row)
+    else:
+        for row in rows(day, part):
+            yield json.dumps(row, default=str) + "\n"
+
+def chunks(lines, size=CHUNK_SIZE):
+    # joins lines into larger pieces so a response isn't sent (or handed between threads) one row at a time
+    chunk = []
+    length = 0
+    for line in lines:
+        chunk.append(line)
+        length += len(line)
+        if length >= size:
+            yield "".join(chunk)
+            chunk = []
+            length = 0
+    if chunk:
+        yield "".join(chunk)
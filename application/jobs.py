@@ -0,0 +1,145 @@
+import asyncio
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from . import admission, metrics
+
+JUDGE_CONCURRENCY = int(os.getenv("JUDGE_CONCURRENCY", 2)) # judge runs allowed at once per server process
+JOB_TTL = 600 # seconds a finished job stays available for polling
+
+class Job:
+    # events are (name, data) pairs published while the job runs, kept so a late stream can replay them
+    def __init__(self, owner, key, ticket):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.key = key
+        self.ticket = ticket # admission ticket, the job waits for a machine-wide judge slot with it
+        self.status = "queued"
+        self.result = None
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.events = []
+        self.waiters = [] # (loop, asyncio.Event) of streams waiting for the next event
+
+    def wait_time(self):
+        return (self.started_at or time.monotonic()) - self.enqueued_at
+
+_jobs = {}
+_lock = threading.Lock()
+_admit_lock = threading.Lock() # orders admission with the executor's queue, views only reach it through sync_to_async, off the event loop
+_executor = ThreadPoolExecutor(max_workers=JUDGE_CONCURRENCY, thread_name_prefix="judge")
+_recent_waits = []
+
+def _run(job, func, args):
+    # the job always ends up done, even if waiting for a judge slot failed, so its key doesn't stay pending
+    try:
+        with admission.running(job.ticket):
+            with _lock:
+                job.status = "running"
+                job.started_at = time.monotonic()
+                _recent_waits.append(job.wait_time())
+                del _recent_waits[:-100]
+            metrics.QUEUE_WAIT_SECONDS.observe(job.wait_time())
+            result = func(*args, report=lambda event, data: publish(job, event, data))
+    except Exception:
+        traceback.print_exc()
+        result = {"error": "Your submission could not be judged, please try again"}
+    with _lock:
+        job.result = result
+        job.status = "done"
+        job.finished_at = time.monotonic()
+        if job.started_at:
+            metrics.JUDGE_SECONDS.observe(job.finished_at - job.started_at)
+        _append_event(job, "done", result)
+
+def _append_event(job, event, data):
+    job.events.append((event, data))
+    for loop, ready in job.waiters:
+        loop.call_soon_threadsafe(ready.set)
+    job.waiters.clear()
+
+def publish(job, event, data):
+    with _lock:
+        _append_event(job, event, data)
+
+async def wait_for_events(job, since, timeout):
+    # waits on the event loop rather than a thread until the job has events after the first `since` ones,
+    # returns the new ones, or none if the timeout passed first
+    waiter = (asyncio.get_running_loop(), asyncio.Event())
+    with _lock:
+        if len(job.events) > since:
+            return job.events[since:]
+        job.waiters.append(waiter)
+    try:
+        await asyncio.wait_for(waiter[1].wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    with _lock:
+        if waiter in job.waiters:
+            job.waiters.remove(waiter)
+        return job.events[since:]
+
+def _expire_jobs():
+    now = time.monotonic()
+    for job_id in [job_id for job_id, job in _jobs.items() if job.finished_at and now - job.finished_at > JOB_TTL]:
+        del _jobs[job_id]
+
+def _is_pending(key):
+    return any(job.key == key and job.status != "done" for job in _jobs.values())
+
+def is_pending(key):
+    with _lock:
+        return _is_pending(key)
+
+def enqueue(owner, key, func, *args):
+    # only one pending job per key (player, day, part); returns None if one is already waiting
+    # and raises admission.Overloaded if the machine-wide judge queue is full
+    # func is called as func(*args, report=...) where report(event, data) publishes progress to streaming clients
+    with _lock:
+        _expire_jobs()
+        if _is_pending(key):
+            return None
+        # registered first so the key is pending while the ticket is taken
+        job = Job(owner, key, None)
+        _jobs[job.id] = job
+    try:
+        # admitted and handed to the executor under one lock, so slots are granted in the order threads pick jobs up.
+        # admission waits on a file lock shared with every process, so it stays clear of _lock
+        with _admit_lock:
+            job.ticket = admission.admit()
+            _executor.submit(_run, job, func, args)
+    except BaseException:
+        admission.release(job.ticket)
+        with _lock:
+            del _jobs[job.id]
+        raise
+    return job
+
+def get_job(job_id):
+    with _lock:
+        return _jobs.get(job_id)
+
+def queue_position(job):
+    with _lock:
+        if job.status != "queued":
+            return 0
+        return 1 + sum(1 for other in _jobs.values() if other.status == "queued" and other.enqueued_at < job.enqueued_at)
+
+def stats():
+    with _lock:
+        queued = [job for job in _jobs.values() if job.status == "queued"]
+        return {
+            "queue_depth": len(queued),
+            "running": sum(1 for job in _jobs.values() if job.status == "running"),
+            "concurrency": JUDGE_CONCURRENCY,
+            "oldest_wait": max([job.wait_time() for job in queued], default=0),
+            "average_wait": sum(_recent_waits) / len(_recent_waits) if _recent_waits else 0,
+        }
+
+metrics.Gauge("aor_judge_queue_depth", "Submissions waiting to be judged", lambda: stats()["queue_depth"])
+metrics.Gauge("aor_judge_running", "Submissions being judged", lambda: stats()["running"])
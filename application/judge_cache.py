@@ -0,0 +1,88 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from . import metrics, validate
+from .models import JudgeResult
+from .racket_pool import WORKER_SCRIPT
+from .validate import validate_code
+
+CACHE_SIZE = int(os.getenv("JUDGE_CACHE_SIZE", 1024)) # results kept in memory per server process
+TRANSIENT_MESSAGES = ("Code execution timed out.", "Your code crashed during execution\nUnknown Error") # may pass on a retry, never cached
+
+_memory = OrderedDict()
+_lock = threading.Lock()
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def normalize(code):
+    # only changes that can't alter what racket reads, error positions included
+    return code.replace("\r\n", "\n").rstrip()
+
+def tests_version(tests):
+    return hashlib.sha256(json.dumps(tests, sort_keys=True).encode("utf-8")).hexdigest()
+
+@functools.cache
+def harness_version():
+    return hashlib.sha256(WORKER_SCRIPT.read_bytes()).hexdigest()
+
+def judge_version():
+    # verdicts also depend on the limits and the harness, changing either starts a fresh set of results
+    config = [validate.TEST_TIME_LIMIT, validate.TEST_MEMORY_LIMIT, validate.MEMORY_LIMIT, validate.FAIL_FAST, harness_version()]
+    return json.dumps(config)
+
+def cache_key(code, tests):
+    parts = [normalize(code), json.dumps(tests.get("context", [])), tests_version(tests), judge_version()]
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+def _remember(key, value):
+    with _lock:
+        _memory[key] = value
+        _memory.move_to_end(key)
+        while len(_memory) > CACHE_SIZE:
+            _memory.popitem(last=False)
+
+def validate_code_cached(code, tests, day, part, on_result=None):
+    # same (passed, tests_status) as validate_code, without running racket for a submission judged before
+    key = cache_key(code, tests)
+    with _lock:
+        hit = _memory.get(key)
+        if hit:
+            _memory.move_to_end(key)
+    if hit:
+        metrics.CACHE_LOOKUPS.inc(cache="judge", result="memory")
+        return hit[0], json.loads(hit[1])
+
+    stored = JudgeResult._get_collection().find_one_and_update({"_id": key}, {"$set": {"last_used": _now()}})
+    if stored:
+        metrics.CACHE_LOOKUPS.inc(cache="judge", result="stored")
+        _remember(key, (stored["passed"], json.dumps(stored["tests_status"])))
+        return stored["passed"], stored["tests_status"]
+
+    metrics.CACHE_LOOKUPS.inc(cache="judge", result="miss")
+    passed, tests_status = validate_code(code, tests, on_result)
+    if tests_status.get("message") not in TRANSIENT_MESSAGES:
+        # kept serialized so callers can't mutate the cached copy
+        _remember(key, (passed, json.dumps(tests_status)))
+        JudgeResult._get_collection().update_one(
+            {"_id": key},
+            {"$set": {"day": day, "part": part, "passed": passed, "tests_status": tests_status, "last_used": _now()}},
+            upsert=True,
+        )
+    return passed, tests_status
+
+def invalidate(day=None, part=None):
+    # the test set version is part of every key, so this only frees space for results of replaced tests
+    query = {}
+    if day is not None:
+        query["day"] = day
+    if part is not None:
+        query["part"] = part
+    with _lock:
+        _memory.clear()
+    JudgeResult._get_collection().delete_many(query)
@@ -0,0 +1,153 @@
+from datetime import datetime
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from . import mongo_stats
+from .models import User, Problem, DayLeaderboard, OverallLeaderboard
+
+BOARD_SIZE = 10
+OVERALL_SIZE = 20
+BOARDS = {1: "one_star", 2: "two_stars"} # part -> DayLeaderboard field
+DAYS = range(1, 26)
+
+def record_solve(problem, user):
+    # adds a freshly solved problem to its day board, a single atomic update so simultaneous solves can't clobber each other
+    board = BOARDS[problem.part]
+    entry = {
+        "player": problem.player,
+        "name": user.username,
+        "link": user.url,
+        "time": problem.time_taken if problem.part == 1 else problem.total_time,
+    }
+    def push(upsert):
+        return DayLeaderboard._get_collection().find_one_and_update(
+            {"day": problem.day, f"{board}.player": {"$ne": problem.player}},
+            {
+                "$push": {board: {"$each": [entry], "$sort": {"time": 1}, "$slice": BOARD_SIZE}},
+                "$inc": {"version": 1},
+                "$set": {"updated_at": datetime.now()},
+            },
+            projection={f"{board}.player": 1},
+            upsert=upsert,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    try:
+        updated = push(upsert=True)
+    except DuplicateKeyError:
+        # either the player is already on this board or another solve created the day's board first,
+        # the filter's $ne keeps MongoDB from retrying the upsert itself. Now the board exists, so a plain
+        # update only misses when the player is already on it
+        updated = push(upsert=False)
+    if updated and any(e["player"] == problem.player for e in updated.get(board, [])):
+        refresh_overall()
+
+def compute_overall(day_boards, size=OVERALL_SIZE):
+    # size=None keeps every player who scored
+    playerList = {}
+    for day_board in sorted(day_boards, key=lambda b: b["day"]):
+        for board in BOARDS.values():
+            for i, entry in enumerate(day_board.get(board, [])):
+                if not entry["link"] in playerList:
+                    playerList[entry["link"]] = {
+                        "score": 0,
+                        "name": entry["name"]
+                    }
+                playerList[entry["link"]]["score"] += BOARD_SIZE - i
+    lb = [{"name": player["name"], "score": player["score"], "link": link} for link, player in playerList.items()]
+    lb.sort(key=lambda plr: plr["score"], reverse=True)
+    return lb[:size]
+
+def refresh_overall():
+    day_boards = list(DayLeaderboard._get_collection().find({}, {"day": 1, "one_star": 1, "two_stars": 1, "version": 1}))
+    source_version = sum(b.get("version", 0) for b in day_boards)
+    try:
+        # only replace the stored board with one computed from newer day boards
+        OverallLeaderboard._get_collection().update_one(
+            {"_id": "overall", "source_version": {"$lt": source_version}},
+            {"$set": {
+                "entries": compute_overall(day_boards),
+                "source_version": source_version,
+                "updated_at": datetime.now(),
+            }},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # a concurrent refresh already stored a board at least as new as this one
+        pass
+
+def query_day_board(day, part, page=1, per_page=BOARD_SIZE):
+    # ranks one page of a day's solves straight from Problem documents: one query for the page,
+    # one batched $in lookup for the players on it and one count
+    sort_field = "time_taken" if part == 1 else "total_time"
+    offset = (page - 1) * per_page
+    with mongo_stats.count_round_trips() as round_trips:
+        solved = Problem.objects(day=day, part=part, correct=True)
+        problems = list(solved.order_by(sort_field).skip(offset).limit(per_page).only("player", sort_field).as_pymongo())
+
+        # Problem.player holds the github id as a string, User.github_id is an int
+        player_ids = [int(problem["player"]) for problem in problems]
+        users = {}
+        if player_ids:
+            users = {user["github_id"]: user for user in User.objects(github_id__in=player_ids).only("github_id", "username", "url").as_pymongo()}
+
+        total = solved.count()
+
+    entries = []
+    for i, problem in enumerate(problems):
+        user = users.get(int(problem["player"]), {})
+        entries.append({
+            "rank": offset + i + 1,
+            "player": problem["player"],
+            "name": user.get("username"),
+            "link": user.get("url"),
+            "time": problem.get(sort_field),
+        })
+    return {
+        "entries": entries,
+        "page": page,
+        "per_page": per_page,
+        "total": total,
+        "pages": (total + per_page - 1) // per_page,
+        "round_trips": round_trips.count,
+    }
+
+def compute_day_board(day, part):
+    entries = query_day_board(day, part)["entries"]
+    return [{"player": e["player"], "name": e["name"], "link": e["link"], "time": e["time"]} for e in entries]
+
+def rebuild():
+    # recomputes every board from Problem documents
+    for day in DAYS:
+        DayLeaderboard._get_collection().update_one(
+            {"day": day},
+            {
+                "$set": {
+                    "one_star": compute_day_board(day, 1),
+                    "two_stars": compute_day_board(day, 2),
+                    "updated_at": datetime.now(),
+                },
+                "$inc": {"version": 1},
+            },
+            upsert=True,
+        )
+    refresh_overall()
+
+def board_version(day=None):
+    # (version, updated_at) of a stored day board, or of the overall board when day is None, without loading the entries
+    if day is None:
+        doc = OverallLeaderboard._get_collection().find_one({"_id": "overall"}, {"source_version": 1, "updated_at": 1})
+        return (doc.get("source_version", 0), doc.get("updated_at")) if doc else (0, None)
+    doc = DayLeaderboard._get_collection().find_one({"day": day}, {"version": 1, "updated_at": 1})
+    return (doc.get("version", 0), doc.get("updated_at")) if doc else (0, None)
+
+def get_day_leaderboards(day):
+    day_board = DayLeaderboard.objects(day=day).first()
+    if not day_board:
+        return [], []
+    return day_board.one_star, day_board.two_stars
+
+def get_overall():
+    overall = OverallLeaderboard.objects(name="overall").first()
+    return overall.entries if overall else []
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from application.models import User, Problem, DayLeaderboard, OverallLeaderboard, RateLimitCounter
+
+# (description, model, filter, sort, limit) for every query the views run
+QUERY_SHAPES = [
+    ("user by github id", User, {"github_id": 1}, None, 1),
+    ("player's problem", Problem, {"player": "1", "day": 1, "part": 1}, None, 1),
+    ("player's solved part 1", Problem, {"player": "1", "day": 1, "part": 1, "correct": True}, None, 1),
+    ("one star leaderboard", Problem, {"day": 1, "part": 1, "correct": True}, [("time_taken", 1)], 10),
+    ("two star leaderboard", Problem, {"day": 1, "part": 2, "correct": True}, [("total_time", 1)], 10),
+    ("stored day leaderboard", DayLeaderboard, {"day": 1}, None, 1),
+    ("stored overall leaderboard", OverallLeaderboard, {"_id": "overall"}, None, 1),
+    ("rate limit counter", RateLimitCounter, {"_id": "hourly:1"}, None, 1),
+]
+
+def plan_stages(plan):
+    stages = [plan.get("stage")]
+    for child in [plan.get("inputStage")] + plan.get("inputStages", []):
+        if child:
+            stages += plan_stages(child)
+    return stages
+
+class Command(BaseCommand):
+    help = "Explain every query shape used by the views and flag collection scans and in-memory sorts"
+
+    def handle(self, *args, **options):
+        scans = []
+        for description, model, query, sort, limit in QUERY_SHAPES:
+            cursor = model._get_collection().find(query).limit(limit)
+            if sort:
+                cursor = cursor.sort(sort)
+            winning_plan = cursor.explain()["queryPlanner"]["winningPlan"]
+            stages = plan_stages(winning_plan.get("queryPlan", winning_plan))
+
+            if "COLLSCAN" in stages:
+                scans.append(description)
+                self.stdout.write(self.style.ERROR(f"COLLSCAN  {description}: {' <- '.join(stages)}"))
+            elif "SORT" in stages:
+                self.stdout.write(self.style.WARNING(f"SORT      {description}: {' <- '.join(stages)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"OK        {description}: {' <- '.join(stages)}"))
+
+        if scans:
+            raise CommandError(f"{len(scans)} queries scan a whole collection, run `manage.py ensure_indexes`")
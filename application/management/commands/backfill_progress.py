@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from application.models import User, Problem, progress_bit
+
+BATCH_SIZE = 500
+
+class Command(BaseCommand):
+    help = "Rebuild User.progress star bitmaps from solved Problem documents"
+
+    def handle(self, *args, **options):
+        solved = Problem._get_collection().aggregate([
+            {"$match": {"correct": True}},
+            {"$group": {"_id": "$player", "parts": {"$addToSet": {"day": "$day", "part": "$part"}}}},
+        ])
+
+        updated = 0
+        batch = []
+        for player in solved:
+            progress = 0
+            for solve in player["parts"]:
+                progress |= progress_bit(solve["day"], solve["part"])
+            batch.append(UpdateOne({"github_id": int(player["_id"])}, {"$set": {"progress": progress}}))
+            if len(batch) >= BATCH_SIZE:
+                updated += User._get_collection().bulk_write(batch, ordered=False).modified_count
+                batch = []
+        if batch:
+            updated += User._get_collection().bulk_write(batch, ordered=False).modified_count
+
+        self.stdout.write(self.style.SUCCESS(f"Updated progress for {updated} users"))
@@ -0,0 +1,115 @@
+import json
+import os
+import platform
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from mongoengine import connect, disconnect
+from mongoengine.connection import get_db
+
+from application import jobs, judge_cache, mongo_stats, problem_manager, racket_pool, views
+from application.bench import surge, stubs
+from application.management.commands.ensure_indexes import MODELS
+from application.models import User
+
+class Command(BaseCommand):
+    help = "Replay a midnight unlock surge against local stand-ins and report latency, throughput and call counts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200, help="players arriving in the surge")
+        parser.add_argument("--ramp", type=float, default=2.0, help="seconds over which the players arrive")
+        parser.add_argument("--day", type=int, default=1, help="day that unlocks")
+        parser.add_argument("--part", type=int, default=1, choices=[1, 2])
+        parser.add_argument("--seed", type=int, default=0, help="seed for the arrival times")
+        parser.add_argument("--mongo-uri", default=os.getenv("BENCH_MONGODB_URI", "mongodb://localhost:27017"), help="MongoDB the benchmark database is created on")
+        parser.add_argument("--db", default="aor_bench", help="scratch database, dropped before and after the run")
+        parser.add_argument("--keep-db", action="store_true", help="leave the scratch database in place afterwards")
+        parser.add_argument("--real-racket", action="store_true", help="judge with the installed racket instead of the stub")
+        parser.add_argument("--racket-delay", type=float, default=0.005, help="seconds the racket stub spends on each test")
+        parser.add_argument("--manager-latency", type=float, default=0.02, help="seconds the Problem Manager stub takes per request")
+        parser.add_argument("--poll-interval", type=float, default=0.5, help="seconds between result polls, like the problem page")
+        parser.add_argument("--output", help="write the results as JSON to this file")
+        parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+        parser.add_argument("--tolerance", type=float, default=20, help="percent latency or throughput may worsen before it counts as a regression")
+
+    def handle(self, *args, **options):
+        if options["db"] == os.getenv("MONGODB_NAME"):
+            raise CommandError("--db must not be the application database, it is dropped")
+        config = {key: options[key] for key in ("users", "ramp", "day", "part", "seed", "real_racket", "racket_delay", "manager_latency", "poll_interval")}
+        config.update({
+            "racket_pool_size": racket_pool.POOL_SIZE,
+            "judge_concurrency": jobs.JUDGE_CONCURRENCY,
+            "cpus": os.cpu_count(),
+            "python": platform.python_version(),
+        })
+
+        self.connect(options["mongo_uri"], options["db"])
+        manager = stubs.ProblemManagerStub(options["manager_latency"])
+        with tempfile.TemporaryDirectory() as racket_root:
+            try:
+                self.setup(manager, racket_root, options)
+                run = surge.Surge(options["users"], options["ramp"], options["day"], options["part"], options["seed"], options["poll_interval"])
+                self.stdout.write(f"Replaying an unlock surge of {options['users']} players over {options['ramp']}s")
+                run.run()
+            finally:
+                manager.stop()
+                racket_pool.get_pool().close()
+                if not options["keep_db"]:
+                    get_db().client.drop_database(options["db"])
+
+        results = surge.report(run, config)
+        results["problem_manager_hits"] = dict(manager.hits)
+        self.print_results(results)
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(results, indent=2))
+            self.stdout.write(f"Results written to {options['output']}")
+        if options["baseline"]:
+            self.check_baseline(results, json.loads(Path(options["baseline"]).read_text()), options["tolerance"])
+
+    def connect(self, uri, db):
+        # point both the mongoengine and the async clients at the scratch database
+        disconnect()
+        connect(db=db, host=uri, event_listeners=[mongo_stats.listener])
+        os.environ["MONGODB_URI"] = uri
+        get_db().client.drop_database(db)
+        for model in MODELS:
+            model.ensure_indexes()
+
+    def setup(self, manager, racket_root, options):
+        now = datetime.now()
+        User._get_collection().insert_many([
+            {"github_id": i, "username": f"bench-{i}", "url": f"https://github.com/bench-{i}", "created_at": now, "progress": 0}
+            for i in range(1, options["users"] + 1)
+        ])
+
+        problem_manager.API_URL = manager.start()
+        problem_manager.invalidate()
+        problem_manager.get_session().hooks["response"].append(surge.count_http)
+        judge_cache.invalidate(options["day"], options["part"])
+        # players submit straight away, which would otherwise be rejected as not having read the problem
+        views.TIME_TO_READ = 0
+
+        if not options["real_racket"]:
+            os.environ["BENCH_RACKET_DELAY"] = str(options["racket_delay"])
+            racket_pool.RACKET_ROOT = stubs.make_racket_root(racket_root)
+
+    def print_results(self, results):
+        self.stdout.write(f"{'endpoint':<20}{'requests':>10}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}{'mongo':>8}{'http':>8}")
+        for endpoint, stats in results["endpoints"].items():
+            self.stdout.write(
+                f"{endpoint:<20}{stats['requests']:>10}{stats['errors']:>8}{stats['p50_ms']:>10}{stats['p99_ms']:>10}"
+                f"{stats['mongo_calls']:>8}{stats['http_calls']:>8}"
+            )
+        judge = results["judge"]
+        self.stdout.write(f"Judged {judge['submissions']} submissions, submit to result p50 {judge['p50_ms']} ms, p99 {judge['p99_ms']} ms")
+        self.stdout.write(self.style.SUCCESS(f"{results['throughput']} requests/s over {results['wall_time']}s"))
+
+    def check_baseline(self, results, baseline, tolerance):
+        if baseline["config"] != results["config"]:
+            raise CommandError("The baseline was recorded with a different configuration, the runs aren't comparable")
+        regressions = surge.compare(results, baseline, tolerance)
+        if regressions:
+            raise CommandError("Regressions against the baseline:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
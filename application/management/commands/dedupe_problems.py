@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from application.models import Problem
+
+class Command(BaseCommand):
+    help = "Delete duplicate Problem documents for the same player, day and part so the unique index can be built"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="only print the duplicates that would be deleted")
+
+    def handle(self, *args, **options):
+        # per (player, day, part) keep the solved row if there is one, otherwise the one started first
+        duplicates = Problem._get_collection().aggregate([
+            {"$sort": {"correct": -1, "time_started": 1, "_id": 1}},
+            {"$group": {"_id": {"player": "$player", "day": "$day", "part": "$part"}, "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}},
+        ], allowDiskUse=True)
+
+        removed = []
+        for group in duplicates:
+            keep, drop = group["ids"][0], group["ids"][1:]
+            key = group["_id"]
+            self.stdout.write(f"{key['player']} day {key['day']} part {key['part']}: keeping {keep}, deleting {len(drop)}")
+            removed.extend(drop)
+
+        if options["dry_run"]:
+            self.stdout.write(self.style.SUCCESS(f"Dry run: {len(removed)} duplicate problems would be deleted"))
+            return
+        if removed:
+            Problem._get_collection().delete_many({"_id": {"$in": removed}})
+        self.stdout.write(self.style.SUCCESS(f"Deleted {len(removed)} duplicate problems"))
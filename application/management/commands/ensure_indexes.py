@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from application.models import User, Problem, DayLeaderboard, OverallLeaderboard, RateLimitCounter, JudgeResult
+
+MODELS = [User, Problem, DayLeaderboard, OverallLeaderboard, RateLimitCounter, JudgeResult]
+INDEX_CONFLICT_CODES = (85, 86) # IndexOptionsConflict, IndexKeySpecsConflict
+
+class Command(BaseCommand):
+    help = "Create the MongoDB indexes declared on the models"
+
+    def handle(self, *args, **options):
+        for model in MODELS:
+            try:
+                model.ensure_indexes()
+            except DuplicateKeyError as e:
+                raise CommandError(f"{model.__name__}: a unique index can't be built over duplicate documents, run `manage.py dedupe_problems` first ({e.details.get('errmsg', e)})")
+            except OperationFailure as e:
+                if e.code not in INDEX_CONFLICT_CODES:
+                    raise
+                # an index changed options (e.g. became unique), the old one has to be dropped by hand so
+                # a deploy never leaves the collection without its indexes
+                raise CommandError(f"{model.__name__}: {e.details.get('errmsg', e)}. Drop the old index and run this again")
+            names = sorted(model._get_collection().index_information())
+            self.stdout.write(f"{model.__name__}: {', '.join(names)}")
+        self.stdout.write(self.style.SUCCESS("Indexes are up to date"))
@@ -0,0 +1,24 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from application import export
+
+class Command(BaseCommand):
+    help = "Stream submissions or leaderboards as NDJSON or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=list(export.DATASETS), help="problems, the full per day standings or the overall scores")
+        parser.add_argument("--format", choices=list(export.FORMATS), default="ndjson")
+        parser.add_argument("--day", type=int, help="only export this day")
+        parser.add_argument("--part", type=int, choices=[1, 2], help="only export this part")
+        parser.add_argument("--output", help="file to write to (default: stdout)")
+
+    def handle(self, *args, **options):
+        out = open(options["output"], "w", newline="") if options["output"] else sys.stdout
+        try:
+            for chunk in export.chunks(export.lines(options["dataset"], options["format"], options["day"], options["part"])):
+                out.write(chunk)
+        finally:
+            if options["output"]:
+                out.close()
@@ -0,0 +1,64 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+PROBE = ["-m", "application.bench.cold_start"]
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)")
+
+class Command(BaseCommand):
+    help = "Measure how long a fresh server process takes to import its modules, boot and answer the first request"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/", help="page requested once the app has booted")
+        parser.add_argument("--runs", type=int, default=5, help="cold starts to take the median of")
+        parser.add_argument("--top", type=int, default=15, help="slowest top-level imports to list")
+        parser.add_argument("--budget-ms", type=float, default=os.getenv("STARTUP_BUDGET_MS"), help="fail if the median time to first response is above this")
+
+    def handle(self, *args, **options):
+        self.report_imports(options["path"], options["top"])
+
+        runs = [self.cold_start(options["path"]) for _ in range(options["runs"])]
+        if any(run["status"] is None or run["status"] >= 500 for run in runs):
+            raise CommandError(f"The first request to {options['path']} failed: {runs}")
+        boot = statistics.median(run["boot_ms"] for run in runs)
+        first_response = statistics.median(run["total_ms"] for run in runs)
+        self.stdout.write(f"Boot (Django setup and app imports): {boot:.0f} ms")
+        self.stdout.write(f"Time to first response from process start: {first_response:.0f} ms (median of {len(runs)})")
+
+        if options["budget_ms"] is not None:
+            budget = float(options["budget_ms"])
+            if first_response > budget:
+                raise CommandError(f"Cold start took {first_response:.0f} ms, over the {budget:.0f} ms budget")
+            self.stdout.write(self.style.SUCCESS(f"Within the {budget:.0f} ms budget"))
+
+    def cold_start(self, path):
+        # wall time from spawning the interpreter to its answer, so interpreter startup counts too
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, *PROBE, path], cwd=settings.BASE_DIR, stdout=subprocess.PIPE, text=True)
+        line = process.stdout.readline()
+        total = (time.perf_counter() - start) * 1000
+        process.wait()
+        if not line:
+            raise CommandError("The startup probe exited without answering")
+        return {**json.loads(line), "total_ms": round(total, 1)}
+
+    def report_imports(self, path, top):
+        result = subprocess.run([sys.executable, "-X", "importtime", *PROBE, path], cwd=settings.BASE_DIR, capture_output=True, text=True)
+        imports = []
+        for line in result.stderr.splitlines():
+            match = IMPORT_TIME_LINE.match(line)
+            # nested imports are indented under the module that triggered them, keep the top-level ones
+            if match and len(match.group(3)) == 1:
+                imports.append((int(match.group(2)), match.group(4)))
+        total = sum(cumulative for cumulative, _ in imports)
+
+        self.stdout.write(f"Imports: {total / 1000:.0f} ms in total, slowest top-level modules:")
+        for cumulative, module in sorted(imports, reverse=True)[:top]:
+            self.stdout.write(f"  {cumulative / 1000:8.1f} ms  {module}")
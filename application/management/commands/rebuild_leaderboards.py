@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from application import leaderboards
+
+class Command(BaseCommand):
+    help = "Recompute the stored day and overall leaderboards from Problem documents"
+
+    def handle(self, *args, **options):
+        leaderboards.rebuild()
+        self.stdout.write(self.style.SUCCESS("Rebuilt leaderboards for all days"))
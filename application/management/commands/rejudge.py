@@ -0,0 +1,160 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from bson import ObjectId
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from application import leaderboards, problem_manager
+from application.export import batches
+from application.judge_cache import TRANSIENT_MESSAGES
+from application.models import User, Problem, progress_bit
+from application.validate import validate_code
+from application.views import PART_2_MARKER, TIME_TO_READ
+
+PROJECTION = {"player": 1, "day": 1, "part": 1, "code": 1, "correct": 1, "time_started": 1, "last_submission_time": 1}
+
+class Command(BaseCommand):
+    help = "Re-run stored submissions against the current test cases and update their results"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--day", type=int, help="only rejudge this day")
+        parser.add_argument("--part", type=int, choices=[1, 2], help="only rejudge this part")
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="judge processes (default: one per core)")
+        parser.add_argument("--batch-size", type=int, default=200, help="submissions read, judged and written per batch")
+        parser.add_argument("--dry-run", action="store_true", help="only print who would gain or lose a star")
+        parser.add_argument("--resume", action="store_true", help="continue after the last batch of an interrupted run")
+        parser.add_argument("--checkpoint", help="file the last written problem id is kept in")
+
+    def handle(self, *args, **options):
+        query = {"code": {"$nin": [None, ""]}}
+        if options["day"]:
+            query["day"] = options["day"]
+        if options["part"]:
+            query["part"] = options["part"]
+
+        checkpoint = Path(options["checkpoint"] or f".rejudge-{options['day'] or 'all'}-{options['part'] or 'all'}.checkpoint")
+        if options["resume"] and checkpoint.exists():
+            query["_id"] = {"$gt": ObjectId(checkpoint.read_text().strip())}
+            self.stdout.write(f"Resuming after {checkpoint.read_text().strip()}")
+        total = Problem._get_collection().count_documents(query)
+
+        cursor = Problem._get_collection().find(query, PROJECTION, no_cursor_timeout=True).sort("_id", 1).batch_size(options["batch_size"])
+        tests = {}
+        done = gained = lost = skipped = 0
+
+        # --workers already keeps every core busy, so each judge process runs one racket at a time
+        # rather than its own warm pool with test suites sharded across it
+        os.environ["RACKET_POOL_SIZE"] = "1"
+        os.environ["JUDGE_SHARDS"] = "1"
+        # spawn so judge processes don't inherit the parent's MongoDB client threads (and read the settings above)
+        with ProcessPoolExecutor(max_workers=options["workers"], mp_context=multiprocessing.get_context("spawn")) as executor:
+            try:
+                for batch in batches(cursor, options["batch_size"]):
+                    batch_gained, batch_lost, batch_skipped = self.rejudge_batch(executor, batch, tests, options["dry_run"])
+                    done, gained, lost, skipped = done + len(batch), gained + batch_gained, lost + batch_lost, skipped + batch_skipped
+                    if not options["dry_run"]:
+                        checkpoint.write_text(str(batch[-1]["_id"]))
+                    self.stdout.write(f"{done}/{total} rejudged, {gained} stars gained, {lost} lost, {skipped} left as they were")
+            finally:
+                cursor.close()
+
+        if skipped:
+            self.stdout.write(self.style.WARNING(f"{skipped} submissions timed out, crashed without a message or couldn't be timed and were left as they were, see the ? lines above"))
+        if options["dry_run"]:
+            self.stdout.write(self.style.SUCCESS(f"Dry run: {gained} stars would be gained and {lost} lost, nothing was written"))
+            return
+
+        if gained or lost:
+            leaderboards.rebuild()
+        checkpoint.unlink(missing_ok=True)
+        self.stdout.write(self.style.SUCCESS(f"Rejudged {done} submissions: {gained} stars gained, {lost} lost"))
+
+    def rejudge_batch(self, executor, batch, tests, dry_run):
+        # returns (stars gained, stars lost, submissions left as they were)
+        for problem in batch:
+            key = (problem["day"], problem["part"])
+            if key not in tests:
+                tests[key] = problem_manager.get_tests(*key)
+
+        codes = self.submitted_code(batch)
+        results = list(executor.map(validate_code, codes, [tests[(problem["day"], problem["part"])] for problem in batch]))
+
+        judged = []
+        skipped = 0
+        part1_times = {}
+        for problem, (passed, tests_status) in zip(batch, results):
+            if tests_status.get("message") in TRANSIENT_MESSAGES:
+                # may pass on a retry, most likely the machine is overloaded, so the stored verdict stands
+                skipped += 1
+                message = tests_status["message"].replace("\n", ": ")
+                self.stdout.write(self.style.WARNING(f"? {problem['player']} day {problem['day']} part {problem['part']} ({problem['_id']}) left as it was: {message}"))
+                continue
+            fields = {"tests": tests_status.get("results", []), "tests_message": tests_status.get("message", "Unknown error"), "correct": passed, "usage": tests_status.get("usage", {})}
+            # the original solve time is unknown, the last submission is the closest record of it
+            if passed and not problem.get("correct", False) and problem.get("last_submission_time"):
+                fields["time_taken"] = max(0, int((problem["last_submission_time"] - problem["time_started"]).total_seconds()) - TIME_TO_READ)
+                if problem["part"] == 1:
+                    part1_times[(problem["player"], problem["day"])] = fields["time_taken"]
+            judged.append((problem, fields))
+
+        gained_part2 = [problem["player"] for problem, fields in judged if problem["part"] == 2 and "time_taken" in fields]
+        if gained_part2:
+            # one batched lookup for the part 1 times that part 2 totals build on, part 1 gained in this batch isn't written yet
+            stored = Problem._get_collection().find({"player": {"$in": gained_part2}, "part": 1}, {"player": 1, "day": 1, "time_taken": 1})
+            part1_times = {**{(p["player"], p["day"]): p.get("time_taken") for p in stored}, **part1_times}
+
+        problem_fields = []
+        user_updates = []
+        gained = lost = 0
+        for problem, fields in judged:
+            was_correct = problem.get("correct", False)
+            bit = progress_bit(problem["day"], problem["part"])
+
+            if fields["correct"] and not was_correct:
+                if problem["part"] == 2 and "time_taken" in fields:
+                    part1_time = part1_times.get((problem["player"], problem["day"]))
+                    if part1_time is not None:
+                        fields["total_time"] = fields["time_taken"] + part1_time
+                timing = "total_time" if problem["part"] == 2 else "time_taken"
+                if timing not in fields:
+                    # leaderboards rank by these times, a star without one can't be placed
+                    fields["correct"] = False
+                    skipped += 1
+                    self.stdout.write(self.style.WARNING(f"? {problem['player']} passes day {problem['day']} part {problem['part']} but the solve can't be timed, left unsolved"))
+                else:
+                    gained += 1
+                    self.stdout.write(self.style.SUCCESS(f"+ {problem['player']} gains a star on day {problem['day']} part {problem['part']}"))
+                    user_updates.append(UpdateOne({"github_id": int(problem["player"])}, {"$bit": {"progress": {"or": bit}}}))
+            elif was_correct and not fields["correct"]:
+                lost += 1
+                self.stdout.write(self.style.ERROR(f"- {problem['player']} loses a star on day {problem['day']} part {problem['part']}"))
+                user_updates.append(UpdateOne({"github_id": int(problem["player"])}, {"$bit": {"progress": {"and": ~bit}}}))
+
+            problem_fields.append((problem["_id"], fields))
+
+        if not dry_run and problem_fields:
+            Problem._get_collection().bulk_write([UpdateOne({"_id": _id}, {"$set": fields}) for _id, fields in problem_fields], ordered=False)
+            if user_updates:
+                User._get_collection().bulk_write(user_updates, ordered=False)
+        return gained, lost, skipped
+
+    def submitted_code(self, batch):
+        # part 2 is stored without the part 1 solution it builds on, put it back the way the editor submits it
+        part2_players = [problem["player"] for problem in batch if problem["part"] == 2]
+        part1_codes = {}
+        if part2_players:
+            part1_codes = {
+                (p["player"], p["day"]): p.get("code") or ""
+                for p in Problem._get_collection().find({"player": {"$in": part2_players}, "part": 1}, {"player": 1, "day": 1, "code": 1})
+            }
+
+        codes = []
+        for problem in batch:
+            code = problem.get("code") or ""
+            if problem["part"] == 2:
+                code = part1_codes.get((problem["player"], problem["day"]), "") + PART_2_MARKER + code
+            codes.append(code)
+        return codes
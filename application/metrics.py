@@ -0,0 +1,134 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Prometheus metrics kept in this process and rendered in the text exposition format by the /metrics view.
+# Observing is a lock and a few additions, cheap enough to leave on for every request.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+_registry = []
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {} # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    values[i] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            values = sorted((key, list(values)) for key, values in self._values.items())
+        for key, values in values:
+            for bound, count in zip(self.buckets, values):
+                labels = _format_labels(self.labels, key, 'le="%s"' % bound)
+                yield f"{self.name}_bucket{labels} {count}"
+            labels = _format_labels(self.labels, key, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {values[-1]}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(values[-2])}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {values[-1]}"
+
+class Gauge:
+    # read from `collect` when the metrics are scraped, for values some other module already tracks
+    def __init__(self, name, help, collect):
+        self.name = name
+        self.help = help
+        self.collect = collect
+        _registry.append(self)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {_format_value(self.collect())}"
+
+def render():
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+REQUEST_SECONDS = Histogram("aor_request_seconds", "Time to respond to a request, by view", ("view",))
+MONGO_QUERIES = Histogram("aor_mongo_queries", "MongoDB commands sent while handling a request, by view", ("view",), COUNT_BUCKETS)
+PHASE_SECONDS = Histogram("aor_phase_seconds", "Time spent in each timed phase of a request or judge run", ("phase",))
+JUDGE_SECONDS = Histogram("aor_judge_seconds", "Time from a submission starting to be judged to its result")
+JUDGE_CPU_SECONDS = Histogram("aor_judge_cpu_seconds", "Racket CPU time a submission's tests used")
+QUEUE_WAIT_SECONDS = Histogram("aor_judge_queue_wait_seconds", "Time a submission waited in the queue before being judged")
+SKIPPED_TESTS = Counter("aor_judge_skipped_tests_total", "Hidden tests left unjudged because a public test had already failed")
+SAVED_SECONDS = Counter("aor_judge_saved_seconds_total", "Estimated judge time saved by skipping hidden tests")
+ADMISSION_REJECTED = Counter("aor_judge_rejected_total", "Submissions turned away because the judge queue was full")
+CACHE_LOOKUPS = Counter("aor_cache_lookups_total", "Cache lookups by cache and outcome", ("cache", "result"))
+
+# phase -> seconds for the request being handled, None outside of one
+_timings = ContextVar("request_timings", default=None)
+
+@contextmanager
+def collect_timings():
+    timings = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+@contextmanager
+def timed(phase):
+    # adds the block's duration to the current request's Server-Timing and to the phase histogram
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        PHASE_SECONDS.observe(elapsed, phase=phase)
+        timings = _timings.get()
+        if timings is not None:
+            timings[phase] = timings.get(phase, 0) + elapsed
+
+def server_timing(timings):
+    return ", ".join(f"{phase};dur={seconds * 1000:.1f}" for phase, seconds in timings.items())
@@ -0,0 +1,34 @@
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+
+from . import metrics, mongo_stats
+
+def _finish(request, response, timings, trips, start):
+    elapsed = time.perf_counter() - start
+    view = request.resolver_match.url_name if request.resolver_match else "unmatched"
+    metrics.REQUEST_SECONDS.observe(elapsed, view=view)
+    metrics.MONGO_QUERIES.observe(trips.count, view=view)
+
+    mongo = f'mongo;desc="{trips.count} queries";dur={trips.duration * 1000:.1f}'
+    response["Server-Timing"] = ", ".join(filter(None, [mongo, metrics.server_timing(timings), f"total;dur={elapsed * 1000:.1f}"]))
+    return response
+
+@sync_and_async_middleware
+def timing_middleware(get_response):
+    # times every request, reporting MongoDB, the phases views mark with metrics.timed() and the total
+    # in a Server-Timing header and in the /metrics histograms
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            start = time.perf_counter()
+            with metrics.collect_timings() as timings, mongo_stats.count_round_trips() as trips:
+                response = await get_response(request)
+            return _finish(request, response, timings, trips, start)
+    else:
+        def middleware(request):
+            start = time.perf_counter()
+            with metrics.collect_timings() as timings, mongo_stats.count_round_trips() as trips:
+                response = get_response(request)
+            return _finish(request, response, timings, trips, start)
+    return middleware
@@ -1,8 +1,12 @@
 from django.db import models
-from mongoengine import Document, StringField, IntField, BooleanField, DateTimeField, ListField, ReferenceField
+from mongoengine import Document, EmbeddedDocument, StringField, IntField, LongField, BooleanField, DateTimeField, ListField, ReferenceField, EmbeddedDocumentField, DictField
 
 # Create your models here.
 
+def progress_bit(day, part):
+    # the User.progress bit for one part of a day
+    return 1 << (2 * (day - 1) + (part - 1))
+
 class User(Document):
     github_id = IntField(required=True, unique=True)
     username = StringField(required=True)
@@ -10,8 +14,13 @@ class User(Document):
     created_at = DateTimeField(required=True)
     avatar_url = StringField()
     access_token = StringField()
-    problems = ListField(ListField(ReferenceField('Problem')))
-    submission_history = ListField(DateTimeField())  # list of submission timestamps for hourly rate limiting
+    problems = ListField(ListField(ReferenceField('Problem')))  # no longer written, the calendar reads progress
+    progress = LongField(default=0)  # star bitmap, bit (day-1)*2 + (part-1) is set once that part is solved
+    submission_history = ListField(DateTimeField())  # no longer written, hourly limits live in RateLimitCounter
+
+    meta = {
+        "auto_create_index": False,  # indexes (here the unique github_id) are created at deploy time by `manage.py ensure_indexes`
+    }
 
     def __str__(self):
         return f"{self.name}"
@@ -28,6 +37,85 @@ class Problem(Document):
     tests = ListField(StringField())  # list of [user_output] (index aligns with test cases)
     tests_message = StringField()  # message about the tests, e.g. "All tests passed" or "3/5 tests passed"
     last_submission_time = DateTimeField()  # timestamp of the last submission attempt
+    usage = DictField()  # resources the last judged submission used: time_ms, cpu_ms, peak_memory_mb and the same per test
+
+    meta = {
+        "indexes": [
+            {"fields": ("player", "day", "part"), "unique": True},  # a player's problem, used by problem/submit
+            ("day", "part", "correct", "time_taken"),  # one star leaderboards
+            ("day", "part", "correct", "total_time"),  # two star leaderboards
+        ],
+        "auto_create_index": False,
+    }
+
+    def __str__(self):
+        return f"Submission by {self.player} for {self.day}.{self.part} taking {self.time_taken} seconds"
+
+class LeaderboardEntry(EmbeddedDocument):
+    player = StringField(required=True)
+    name = StringField()
+    link = StringField()
+    time = IntField()  # in seconds, time_taken for one star and total_time for two stars
+
+class DayLeaderboard(Document):
+    day = IntField(required=True, unique=True)
+    one_star = ListField(EmbeddedDocumentField(LeaderboardEntry))  # sorted by time, at most 10 entries
+    two_stars = ListField(EmbeddedDocumentField(LeaderboardEntry))
+    version = IntField(default=0)  # bumped on every change
+    updated_at = DateTimeField()
+
+    meta = {"auto_create_index": False}
+
+    def __str__(self):
+        return f"Leaderboard for day {self.day}"
+
+class OverallEntry(EmbeddedDocument):
+    name = StringField()
+    link = StringField()
+    score = IntField()
+
+class OverallLeaderboard(Document):
+    name = StringField(primary_key=True, default="overall")
+    entries = ListField(EmbeddedDocumentField(OverallEntry))  # sorted by score, at most 20 entries
+    source_version = IntField(default=0)  # sum of the DayLeaderboard versions it was computed from
+    updated_at = DateTimeField()
+
+    meta = {"auto_create_index": False}
+
+    def __str__(self):
+        return "Overall leaderboard"
+
+class RateLimitCounter(Document):
+    key = StringField(primary_key=True)  # "cooldown:<player>:<day>:<part>" or "hourly:<player>"
+    until = DateTimeField()  # end of a cooldown (UTC)
+    bucket = IntField()  # current hourly window number
+    count = IntField(default=0)  # submissions in the current window
+    previous = IntField(default=0)  # submissions in the window before it
+    expires_at = DateTimeField()  # removed by MongoDB once this passes (UTC)
+
+    meta = {
+        "indexes": [{"fields": ["expires_at"], "expireAfterSeconds": 0}],
+        "auto_create_index": False,
+    }
+
+    def __str__(self):
+        return f"Rate limit {self.key}"
+
+class JudgeResult(Document):
+    key = StringField(primary_key=True)  # sha256 of the normalized code, context and test set
+    day = IntField()
+    part = IntField()
+    passed = BooleanField()
+    tests_status = DictField()  # {"message": ..., "results": [...]} exactly as validate_code returned it
+    last_used = DateTimeField()  # results unused for a week are removed by MongoDB
+
+    meta = {
+        "indexes": [
+            {"fields": ["last_used"], "expireAfterSeconds": 7 * 24 * 3600},
+            ("day", "part"),
+        ],
+        "auto_create_index": False,
+    }
 
     def __str__(self):
-        return f"Submission by {self.player} for {self.day}.{self.part} taking {self.time_taken} seconds"
\ No newline at end of file
+        return f"Judge result {self.key} for {self.day}.{self.part}"
@@ -0,0 +1,45 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from pymongo import monitoring
+
+_counter = ContextVar("mongo_round_trips", default=None)
+
+class RoundTrips:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0 # seconds spent waiting on those commands
+
+class CommandCounter(monitoring.CommandListener):
+    # pymongo publishes command events on the thread (and context) that issued the command
+    def started(self, event):
+        trips = _counter.get()
+        if trips is not None:
+            trips.count += 1
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+    def _finished(self, event):
+        trips = _counter.get()
+        if trips is not None:
+            trips.duration += event.duration_micros / 1e6
+
+listener = CommandCounter()
+
+@contextmanager
+def count_round_trips():
+    # counts the commands sent to MongoDB inside the block, nested blocks also count towards the enclosing one
+    parent = _counter.get()
+    trips = RoundTrips()
+    token = _counter.set(trips)
+    try:
+        yield trips
+    finally:
+        _counter.reset(token)
+        if parent is not None:
+            parent.count += trips.count
+            parent.duration += trips.duration
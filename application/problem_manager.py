@@ -0,0 +1,127 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics
+
+API_URL = "https://api.adventofracket.com" # "http://127.0.0.1:5000"
+CACHE_TTL = int(os.getenv("PROBLEM_CACHE_TTL", 300)) # seconds before an entry is revalidated with the API
+CACHE_SIZE = 256 # (day, part, resource) entries, 25 days * 2 parts * 3 resources fit comfortably
+REQUEST_TIMEOUT = (3.05, 10) # (connect, read) seconds per attempt
+RETRIES = 3 # retried with exponential backoff on connection errors and 5xx responses
+RESOURCES = ("tests", "starter", "md")
+
+class FetchError(Exception):
+    def __init__(self, resource, error):
+        super().__init__(str(error))
+        self.resource = resource
+
+class CacheEntry:
+    def __init__(self, text, etag):
+        self.text = text
+        self.etag = etag
+        self.fetched_at = time.monotonic()
+
+    def fresh(self):
+        return time.monotonic() - self.fetched_at < CACHE_TTL
+
+class ProblemCache:
+    # LRU of raw API responses keyed by (day, part, resource)
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, day=None, part=None, resource=None):
+        with self._lock:
+            for key in list(self._entries):
+                if (day is None or key[0] == day) and (part is None or key[1] == part) and (resource is None or key[2] == resource):
+                    del self._entries[key]
+
+_cache = ProblemCache()
+_session = None
+_session_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="problem-manager")
+
+def get_session():
+    # one keep-alive session shared by every thread, so repeat calls reuse open connections
+    global _session
+    with _session_lock:
+        if _session is None:
+            # requests is imported here rather than at module level, keeping it out of the boot path
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            retry = Retry(total=RETRIES, backoff_factor=0.3, status_forcelist=(500, 502, 503, 504), allowed_methods=["GET"])
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=16, max_retries=retry)
+            _session = requests.Session()
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+    return _session
+
+def fetch(day, part, resource):
+    key = (day, part, resource)
+    entry = _cache.get(key)
+    if entry and entry.fresh():
+        metrics.CACHE_LOOKUPS.inc(cache="problem_manager", result="fresh")
+        return entry.text
+
+    headers = {"X-Authorization": f"Bearer {os.getenv('AOR_MANAGER_ACCESS_TOKEN')}"}
+    if entry and entry.etag:
+        headers["If-None-Match"] = entry.etag
+    response = get_session().get(f"{API_URL}/{resource}/{day}/{part}", headers=headers, timeout=REQUEST_TIMEOUT)
+
+    if response.status_code == 304 and entry:
+        metrics.CACHE_LOOKUPS.inc(cache="problem_manager", result="revalidated")
+        _cache.set(key, CacheEntry(entry.text, entry.etag))
+        return entry.text
+    response.raise_for_status()
+    metrics.CACHE_LOOKUPS.inc(cache="problem_manager", result="miss")
+    _cache.set(key, CacheEntry(response.text, response.headers.get("ETag")))
+    return response.text
+
+# each call returns a fresh object, callers are free to mutate it
+def get_tests(day, part):
+    return json.loads(fetch(day, part, "tests"))
+
+def get_starter(day, part):
+    return fetch(day, part, "starter")
+
+def get_description(day, part):
+    return fetch(day, part, "md")
+
+def fetch_problem(day, part):
+    # fetches tests, starter code and description concurrently, raises FetchError naming the first resource that failed
+    import requests
+    # each fetch runs in a copy of the caller's context, so per-request counters see them
+    futures = [_executor.submit(contextvars.copy_context().run, fetch, day, part, resource) for resource in RESOURCES]
+    results = []
+    for resource, future in zip(RESOURCES, futures):
+        try:
+            results.append(future.result())
+        except requests.exceptions.RequestException as e:
+            raise FetchError(resource, e) from e
+    tests, starter, description = results
+    return json.loads(tests), starter, description
+
+def invalidate(day=None, part=None, resource=None):
+    _cache.invalidate(day, part, resource)
@@ -0,0 +1,45 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .models import User
+
+PROFILE_TTL = int(os.getenv("PROFILE_CACHE_TTL", 600)) # seconds a profile is served from memory
+CACHE_SIZE = 4096 # profiles kept per server process
+
+class Profile:
+    # the parts of a player's GitHub profile the app shows, the session only keeps their id and name
+    def __init__(self, username, url, avatar_url=None):
+        self.username = username
+        self.url = url
+        self.avatar_url = avatar_url
+        self.cached_at = time.monotonic()
+
+    def fresh(self):
+        return time.monotonic() - self.cached_at < PROFILE_TTL
+
+_profiles = OrderedDict()
+_lock = threading.Lock()
+
+def remember(user_id, profile):
+    with _lock:
+        _profiles[str(user_id)] = profile
+        _profiles.move_to_end(str(user_id))
+        while len(_profiles) > CACHE_SIZE:
+            _profiles.popitem(last=False)
+
+def get_profile(user_id):
+    # from memory when fresh, otherwise loaded from the User document; None for unknown players
+    with _lock:
+        profile = _profiles.get(str(user_id))
+        if profile and profile.fresh():
+            _profiles.move_to_end(str(user_id))
+            return profile
+
+    user = User.objects(github_id=user_id).only("username", "url", "avatar_url").as_pymongo().first()
+    if not user:
+        return None
+    profile = Profile(user.get("username"), user.get("url"), user.get("avatar_url"))
+    remember(user_id, profile)
+    return profile
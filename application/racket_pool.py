@@ -0,0 +1,187 @@
+import atexit
+import json
+import os
+import queue
+import select
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+RACKET_ROOT = Path(os.getenv("RACKET_ROOT", BASE_DIR / "RacketInstalls" / "racket"))
+WORKER_SCRIPT = Path(__file__).resolve().parent / "racket" / "worker.rkt"
+
+POOL_SIZE = int(os.getenv("RACKET_POOL_SIZE", 2)) # warm racket processes per app process, 0 disables the pool
+MAX_JOBS_PER_WORKER = int(os.getenv("RACKET_WORKER_MAX_JOBS", 200)) # recycle a worker after this many submissions
+JUDGE_TIMEOUT = 15 # seconds
+
+class JudgeTimeout(Exception):
+    pass
+
+class WorkerCrashed(Exception):
+    pass
+
+def racket_command():
+    # racket picks up the compiled/worker_rkt.zo that `raco make` leaves next to the script
+    return [str(RACKET_ROOT / "bin" / "racket"), str(WORKER_SCRIPT)]
+
+def racket_env():
+    run_env = os.environ.copy()
+    run_env["PLTCOLLECTS"] = str(RACKET_ROOT / "collects")
+    return run_env
+
+def parse_record(line):
+    # a line racket didn't finish writing means it died mid-test
+    try:
+        return json.loads(line)
+    except ValueError:
+        raise WorkerCrashed()
+
+def run_once(payload, timeout=JUDGE_TIMEOUT, on_record=None):
+    # cold start: a fresh racket process judges a single job and exits at end of input
+    try:
+        result = subprocess.run(
+            racket_command(),
+            input=json.dumps(payload),
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+            env=racket_env()
+        )
+    except subprocess.TimeoutExpired:
+        raise JudgeTimeout()
+    records = [parse_record(line) for line in result.stdout.splitlines()]
+    if not records or not records[-1].get("done"):
+        raise WorkerCrashed()
+    records = records[:-1]
+    if on_record:
+        for i, record in enumerate(records):
+            on_record(i, record)
+    return records
+
+class RacketWorker:
+    def __init__(self):
+        self.process = subprocess.Popen(
+            racket_command(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=0,
+            env=racket_env()
+        )
+        self.jobs = 0
+        self._buffer = b""
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def run(self, payload, timeout=JUDGE_TIMEOUT, on_record=None):
+        # returns the job's per-test records, handing each to on_record(index, record) as soon as racket writes it
+        self.jobs += 1
+        try:
+            self.process.stdin.write(json.dumps(payload).encode("utf-8") + b"\n")
+        except (BrokenPipeError, OSError):
+            raise WorkerCrashed()
+
+        deadline = time.monotonic() + timeout
+        records = []
+        while True:
+            record = parse_record(self._read_line(deadline))
+            if record.get("done"):
+                return records
+            if on_record:
+                on_record(len(records), record)
+            records.append(record)
+
+    def _read_line(self, deadline):
+        fd = self.process.stdout.fileno()
+        while b"\n" not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise JudgeTimeout()
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                raise JudgeTimeout()
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise WorkerCrashed()
+            self._buffer += chunk
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return line
+
+    def kill(self):
+        if self.alive():
+            self.process.kill()
+        self.process.wait()
+
+class RacketPool:
+    def __init__(self, size=POOL_SIZE, max_jobs=MAX_JOBS_PER_WORKER):
+        self.size = size
+        self.max_jobs = max_jobs
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(RacketWorker())
+
+    def run(self, payload, timeout=JUDGE_TIMEOUT, on_record=None):
+        delivered = []
+        def record(i, result):
+            delivered.append(i)
+            if on_record:
+                on_record(i, result)
+
+        with self._slots:
+            try:
+                return self._run_once(payload, timeout, record)
+            except WorkerCrashed:
+                # the worker may have died while idle, give the job one more try on a fresh one,
+                # unless tests were already reported and would be reported twice
+                if delivered:
+                    raise
+                return self._run_once(payload, timeout, record)
+
+    def _run_once(self, payload, timeout, on_record):
+        worker = self._checkout()
+        try:
+            result = worker.run(payload, timeout, on_record)
+        except BaseException:
+            worker.kill()
+            self._idle.put(RacketWorker())
+            raise
+        self._checkin(worker)
+        return result
+
+    def _checkout(self):
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return RacketWorker()
+            if worker.alive():
+                return worker
+            worker.kill()
+
+    def _checkin(self, worker):
+        if worker.jobs >= self.max_jobs or not worker.alive():
+            worker.kill()
+            worker = RacketWorker()
+        self._idle.put(worker)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                return
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = RacketPool()
+            atexit.register(_pool.close)
+    return _pool
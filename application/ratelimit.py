@@ -0,0 +1,92 @@
+import math
+import time
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from . import async_db
+from .models import RateLimitCounter
+
+WINDOW = 3600 # seconds in the hourly window
+
+class RateLimited(Exception):
+    pass
+
+def _now():
+    # naive UTC, the same form pymongo hands back, so the TTL index expires documents on time
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def _cooldown_key(player, day, part):
+    return f"cooldown:{player}:{day}:{part}"
+
+def _claim_query(key, now, cooldown):
+    # only matches when the cooldown has ended, so a running one makes the upsert hit the unique _id
+    until = now + timedelta(seconds=cooldown)
+    return {"_id": key, "until": {"$lte": now}}, {"$set": {"until": until, "expires_at": until}}
+
+def _cooldown_error(existing, now):
+    remaining = int((existing["until"] - now).total_seconds()) if existing else 0
+    return RateLimited(f"Please wait {remaining} seconds before submitting again")
+
+async def aclaim_cooldown(player, day, part, cooldown):
+    # starts the per-problem cooldown in one atomic upsert, raises RateLimited if one is already running
+    now = _now()
+    key = _cooldown_key(player, day, part)
+    collection = async_db.collection(RateLimitCounter)
+    try:
+        await collection.update_one(*_claim_query(key, now, cooldown), upsert=True)
+    except DuplicateKeyError:
+        # the key exists and its cooldown hasn't ended
+        raise _cooldown_error(await collection.find_one({"_id": key}, {"until": 1}), now)
+
+async def arelease_cooldown(player, day, part):
+    await async_db.collection(RateLimitCounter).delete_one({"_id": _cooldown_key(player, day, part)})
+
+def _window():
+    now = time.time()
+    return int(now // WINDOW), (now % WINDOW) / WINDOW
+
+def _count_update(bucket):
+    # sliding window counter: the previous window's count is weighted by how much of it still overlaps the last hour
+    return [{"$set": {
+        "previous": {"$cond": [
+            {"$eq": ["$bucket", bucket]}, "$previous",
+            {"$cond": [{"$eq": ["$bucket", bucket - 1]}, "$count", 0]},
+        ]},
+        "count": {"$cond": [{"$eq": ["$bucket", bucket]}, {"$add": ["$count", 1]}, 1]},
+        "bucket": bucket,
+        "expires_at": datetime.fromtimestamp((bucket + 2) * WINDOW, timezone.utc).replace(tzinfo=None),
+    }}]
+
+def _limit_error(counter, limit, elapsed):
+    # the wait until a retry is accepted, i.e. until previous * (1 - elapsed) + used + 1 <= limit
+    if limit <= 0:
+        return RateLimited("Submissions are currently closed")
+    used = counter["count"] - 1
+    if used < limit:
+        # wait for the previous window to slide far enough out
+        wait = (1 - (limit - used - 1) / counter["previous"] - elapsed) * WINDOW
+    else:
+        # this window's submissions become the next window's previous ones
+        wait = (1 - elapsed) * WINDOW + (1 - (limit - 1) / used) * WINDOW
+    wait = max(1, math.ceil(wait))
+    return RateLimited(f"Hourly submission limit reached. Try again in {wait // 60:02d}m {wait % 60:02d}s")
+
+async def acount_submission(player, limit):
+    # counts the submission and returns the window it was counted in, for arefund_submission
+    bucket, elapsed = _window()
+    key = f"hourly:{player}"
+    collection = async_db.collection(RateLimitCounter)
+    counter = await collection.find_one_and_update({"_id": key}, _count_update(bucket), upsert=True, return_document=ReturnDocument.AFTER)
+
+    if counter["previous"] * (1 - elapsed) + counter["count"] <= limit:
+        return bucket
+
+    # over the limit, don't count this submission
+    await arefund_submission(player, bucket)
+    raise _limit_error(counter, limit, elapsed)
+
+async def arefund_submission(player, bucket):
+    # takes back a counted submission that wasn't judged, a no-op once its window has passed
+    await async_db.collection(RateLimitCounter).update_one({"_id": f"hourly:{player}", "bucket": bucket, "count": {"$gt": 0}}, {"$inc": {"count": -1}})
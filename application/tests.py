@@ -1,3 +1,449 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.test import RequestFactory, SimpleTestCase
+from pymongo.errors import DuplicateKeyError
+
+from .management.commands import rejudge
+
+from . import admission, async_db, jobs, judge_cache, leaderboards, racket_pool, ratelimit, validate, views
+
+class RateLimitWaitTests(SimpleTestCase):
+    def wait(self, previous, count, limit, elapsed):
+        message = str(ratelimit._limit_error({"previous": previous, "count": count}, limit, elapsed))
+        minutes, seconds = message.rsplit(" ", 2)[-2:]
+        return int(minutes[:-1]) * 60 + int(seconds[:-1])
+
+    def accepted(self, previous, used, limit, elapsed):
+        return previous * (1 - elapsed) + used + 1 <= limit
+
+    def test_wait_for_previous_window_to_slide_out(self):
+        # 51 counted at mid-window with 60 in the previous one, the retry needs the estimate down to 49 + 1
+        wait = self.wait(previous=60, count=21, limit=50, elapsed=0.5)
+        self.assertEqual(wait, 60)
+        self.assertFalse(self.accepted(60, 20, 50, 0.5 + (wait - 1) / ratelimit.WINDOW))
+        self.assertTrue(self.accepted(60, 20, 50, 0.5 + wait / ratelimit.WINDOW))
+
+    def test_wait_into_next_window(self):
+        # 50 used this window: next window they are the previous ones and must weigh at most 49
+        wait = self.wait(previous=0, count=51, limit=50, elapsed=0.75)
+        self.assertEqual(wait, 900 + 72)
+        self.assertTrue(self.accepted(50, 0, 50, 72 / ratelimit.WINDOW))
+        self.assertFalse(self.accepted(50, 0, 50, 71 / ratelimit.WINDOW))
+
+    def test_wait_is_at_least_a_second(self):
+        self.assertEqual(self.wait(previous=60, count=21, limit=50, elapsed=0.9999), 1)
+
+    def test_closed_when_limit_is_zero(self):
+        self.assertEqual(str(ratelimit._limit_error({"previous": 0, "count": 1}, 0, 0.5)), "Submissions are currently closed")
+
+class JudgeCacheKeyTests(SimpleTestCase):
+    tests = {"function_name": "f", "public": [["1", "1"]], "hidden": [["2", "2"]]}
+
+    def test_normalize_ignores_line_endings_and_trailing_whitespace(self):
+        self.assertEqual(judge_cache.normalize("(define x 1)\r\n(f x)  \n\n"), "(define x 1)\n(f x)")
+
+    def test_normalize_keeps_leading_whitespace(self):
+        # it moves error positions
+        self.assertNotEqual(judge_cache.normalize("\n(f 1)"), judge_cache.normalize("(f 1)"))
+
+    def test_key_follows_tests(self):
+        changed = {**self.tests, "hidden": [["2", "3"]]}
+        self.assertEqual(judge_cache.cache_key("(f 1)\r\n", self.tests), judge_cache.cache_key("(f 1)", self.tests))
+        self.assertNotEqual(judge_cache.cache_key("(f 1)", self.tests), judge_cache.cache_key("(f 1)", changed))
+
+    def test_key_follows_judge_limits(self):
+        key = judge_cache.cache_key("(f 1)", self.tests)
+        with mock.patch.object(validate, "TEST_TIME_LIMIT", validate.TEST_TIME_LIMIT + 1):
+            self.assertNotEqual(judge_cache.cache_key("(f 1)", self.tests), key)
+        with mock.patch.object(validate, "FAIL_FAST", not validate.FAIL_FAST):
+            self.assertNotEqual(judge_cache.cache_key("(f 1)", self.tests), key)
+
+class FlakyWorker:
+    # reports the first test of a job, then dies
+    jobs = 0
+
+    def run(self, payload, timeout, on_record):
+        FlakyWorker.jobs += 1
+        on_record(0, {"output": "1"})
+        raise racket_pool.WorkerCrashed()
+
+    def alive(self):
+        return True
+
+    def kill(self):
+        pass
+
+class RacketPoolTests(SimpleTestCase):
+    def test_cut_off_output_is_a_crash(self):
+        command = [sys.executable, "-c", "print('{\"output\": \"1')"]
+        with mock.patch.object(racket_pool, "racket_command", return_value=command):
+            with self.assertRaises(racket_pool.WorkerCrashed):
+                racket_pool.run_once({"code": "", "tests": []})
+
+    def test_no_retry_after_tests_were_reported(self):
+        reported = []
+        FlakyWorker.jobs = 0
+        with mock.patch.object(racket_pool, "RacketWorker", FlakyWorker):
+            pool = racket_pool.RacketPool(size=1)
+            with self.assertRaises(racket_pool.WorkerCrashed):
+                pool.run({"code": "", "tests": ["(f 1)"]}, on_record=lambda i, record: reported.append(i))
+        self.assertEqual(reported, [0])
+        self.assertEqual(FlakyWorker.jobs, 1)
+
+class AsyncClientTests(SimpleTestCase):
+    def test_client_closed_with_its_loop(self):
+        clients = []
+        async def view():
+            clients.append(async_db.get_client())
+            self.assertIs(async_db.get_client(), clients[-1])
+            await asyncio.sleep(0)
+
+        with mock.patch.object(async_db.AsyncMongoClient, "close", autospec=True) as close:
+            # a WSGI server runs each async view on its own loop
+            asyncio.run(view())
+            asyncio.run(view())
+        self.assertIsNot(clients[0], clients[1])
+        self.assertEqual([call.args[0] for call in close.call_args_list], clients)
+
+def record(output):
+    return {"output": output + "\n", "time_ms": 2.0, "cpu_ms": 2, "memory": None}
+
+class ShardedJudgeTests(SimpleTestCase):
+    # public tests expect 1 and 2, hidden ones 3 to 6; shards are run by a stand-in for the harness
+    tests = {"function_name": "f", "public": [["1", "1"], ["2", "2"]], "hidden": [[str(n), str(n)] for n in range(3, 7)]}
+
+    def judge(self, code, shards, harness):
+        calls = []
+        def run_shard(code, shard, on_record=None, expected=None):
+            calls.append(expected)
+            offset = [call for group in shards for call in group].index(shard[0])
+            return harness(offset, shard, expected)
+
+        with mock.patch.object(validate, "split_shards", return_value=shards), mock.patch.object(validate, "run_shard", side_effect=run_shard):
+            passed, status = validate.validate_code(code, self.tests)
+        return passed, status, calls
+
+    def shards(self, sizes):
+        calls = [f"(f {test[0]})" for test in self.tests["public"] + self.tests["hidden"]]
+        groups, start = [], 0
+        for size in sizes:
+            groups.append(calls[start:start + size])
+            start += size
+        return groups
+
+    def wrong_second_public(self, crash_hidden):
+        # answers 0 to the second public test, the first hidden test crashes or times out if it runs
+        def harness(offset, shard, expected):
+            records = []
+            for i in range(offset, offset + len(shard)):
+                if i == 2 and crash_hidden:
+                    return records + [{"error": "boom", "timeout": crash_hidden == "timeout", "time_ms": 1.0, "cpu_ms": 1, "memory": None}]
+                records.append(record("0" if i == 1 else str(i + 1)))
+                if expected and i == 1 and i + 1 < offset + len(shard):
+                    return records + [{"skipped": offset + len(shard) - i - 1}]
+            return records
+        return harness
+
+    def test_public_failure_skips_hidden_tests(self):
+        passed, status, calls = self.judge("", self.shards([6]), self.wrong_second_public(crash_hidden=False))
+        self.assertFalse(passed)
+        self.assertEqual(status["message"], "1/2 passed")
+        self.assertEqual(status["results"], ["1", "0"])
+        self.assertEqual(calls, [["1", "2", None, None, None, None]])
+        self.assertEqual(status["usage"]["skipped_tests"], 4)
+        self.assertEqual(status["usage"]["estimated_saved_ms"], 8.0)
+
+    def test_verdict_does_not_depend_on_sharding(self):
+        for crash in (False, "error", "timeout"):
+            with self.subTest(crash=crash):
+                single = self.judge("", self.shards([6]), self.wrong_second_public(crash))[1]
+                sharded = self.judge("", self.shards([2, 2, 2]), self.wrong_second_public(crash))[1]
+                self.assertEqual(single["message"], "1/2 passed")
+                self.assertEqual(sharded["message"], single["message"])
+                self.assertEqual(sharded["results"], single["results"])
+                self.assertEqual(sharded["usage"]["skipped_tests"], 4)
+
+    def test_hidden_failures_counted_when_public_tests_pass(self):
+        def harness(offset, shard, expected):
+            return [record("0" if i == 4 else str(i + 1)) for i in range(offset, offset + len(shard))]
+        for sizes in ([6], [3, 3]):
+            with self.subTest(sizes=sizes):
+                passed, status, _ = self.judge("", self.shards(sizes), harness)
+                self.assertFalse(passed)
+                self.assertEqual(status["message"], "All public tests pass\n3/4 hidden tests passed")
+                self.assertEqual(status["usage"]["skipped_tests"], 0)
+
+    def test_rejudged_in_full_when_harness_disagrees(self):
+        # the harness skipped after a public test that python considers passed
+        def harness(offset, shard, expected):
+            if expected:
+                return [record("1"), record("2"), {"skipped": 4}]
+            return [record(str(i + 1)) for i in range(offset, offset + len(shard))]
+        passed, status, calls = self.judge("", self.shards([6]), harness)
+        self.assertTrue(passed)
+        self.assertEqual(calls, [["1", "2", None, None, None, None], None])
+        self.assertEqual(status["usage"]["skipped_tests"], 0)
+
+    def test_missing_public_output_is_a_crash(self):
+        passed, status = validate.verify_tests(self.tests, ["1"], skipped=4)
+        self.assertFalse(passed)
+        self.assertEqual(status["message"], "Your code crashed during execution\nUnknown Error")
+
+class AdmissionTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for name, value in (("STATE_FILE", Path(directory.name) / "judge.json"), ("JUDGE_SLOTS", 1), ("JUDGE_QUEUE_LIMIT", 2), ("POLL_INTERVAL", 0.01)):
+            patcher = mock.patch.object(admission, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_ticket_lifecycle(self):
+        first, second = admission.admit(), admission.admit()
+        with self.assertRaises(admission.Overloaded) as overloaded:
+            admission.check()
+        self.assertEqual(overloaded.exception.retry_after, admission.RETRY_AFTER)
+        self.assertRaises(admission.Overloaded, admission.admit)
+
+        with admission.running(first):
+            self.assertEqual(admission.stats(), {"running": 1, "waiting": 1})
+            self.assertFalse(admission._try_start(second))
+        with admission.running(second):
+            self.assertEqual(admission.stats(), {"running": 1, "waiting": 0})
+        self.assertEqual(admission.stats(), {"running": 0, "waiting": 0})
+
+    def test_slots_go_in_admission_order(self):
+        first, second = admission.admit(), admission.admit()
+        admission.release(first)
+        self.assertTrue(admission._try_start(second))
+
+    def test_tickets_of_dead_processes_are_dropped(self):
+        process = subprocess.Popen([sys.executable, "-c", ""])
+        process.wait()
+        admission.STATE_FILE.write_text(f'{{"waiting": ["{process.pid}:a", "{process.pid}:b"], "running": ["{process.pid}:c"]}}')
+        self.assertEqual(admission.stats(), {"running": 0, "waiting": 0})
+        with admission.running(admission.admit()):
+            pass
+
+    def test_disabled(self):
+        with mock.patch.object(admission, "JUDGE_SLOTS", 0):
+            self.assertIsNone(admission.admit())
+            admission.check()
+            with admission.running(None):
+                pass
+
+    def test_job_done_when_waiting_for_a_slot_fails(self):
+        job = jobs.Job("player", ("player", 1, 1), admission.admit())
+        with mock.patch.object(admission, "_try_start", side_effect=OSError("disk full")), mock.patch.object(jobs.traceback, "print_exc"):
+            jobs._run(job, lambda report: {"success": True}, ())
+        self.assertEqual(job.status, "done")
+        self.assertIn("error", job.result)
+        self.assertEqual(admission.stats(), {"running": 0, "waiting": 0})
+
+    def test_full_queue_is_not_enqueued(self):
+        admission.admit(), admission.admit()
+        key = ("player", 1, 1)
+        with self.assertRaises(admission.Overloaded):
+            jobs.enqueue("player", key, lambda report: {})
+        self.assertFalse(jobs.is_pending(key))
+
+def entry(name):
+    return {"player": name, "name": name, "link": f"https://github.com/{name}", "time": 60}
+
+class OverallLeaderboardTests(SimpleTestCase):
+    def test_scores_by_place_on_every_board(self):
+        boards = [
+            {"day": 2, "one_star": [entry("b"), entry("a")], "two_stars": [entry("b")]},
+            {"day": 1, "one_star": [entry("a"), entry("c")], "two_stars": []},
+        ]
+        overall = leaderboards.compute_overall(boards)
+        self.assertEqual([(player["name"], player["score"]) for player in overall], [("b", 20), ("a", 19), ("c", 9)])
+        self.assertEqual(overall[0]["link"], "https://github.com/b")
+
+    def test_size_limits_the_board(self):
+        boards = [{"day": 1, "one_star": [entry(str(i)) for i in range(10)], "two_stars": [entry(str(i)) for i in range(10, 20)]},
+                  {"day": 2, "one_star": [entry(str(i)) for i in range(20, 30)]}]
+        self.assertEqual(len(leaderboards.compute_overall(boards)), leaderboards.OVERALL_SIZE)
+        self.assertEqual(len(leaderboards.compute_overall(boards, size=None)), 30)
+        self.assertEqual(leaderboards.compute_overall([]), [])
+
+class RecordSolveTests(SimpleTestCase):
+    problem = mock.Mock(player="7", day=3, part=1, time_taken=90)
+    user = mock.Mock(username="seven", url="https://github.com/seven")
+
+    def record(self, *results):
+        collection = mock.Mock()
+        collection.find_one_and_update.side_effect = results
+        with mock.patch.object(leaderboards.DayLeaderboard, "_get_collection", return_value=collection), \
+                mock.patch.object(leaderboards, "refresh_overall") as refresh_overall:
+            leaderboards.record_solve(self.problem, self.user)
+        return collection, refresh_overall
+
+    def test_first_solver_creates_the_board(self):
+        collection, refresh_overall = self.record({"one_star": [{"player": "7"}]})
+        self.assertTrue(collection.find_one_and_update.call_args.kwargs["upsert"])
+        refresh_overall.assert_called_once()
+
+    def test_retried_when_another_solve_created_the_board(self):
+        collection, refresh_overall = self.record(DuplicateKeyError("day"), {"one_star": [{"player": "1"}, {"player": "7"}]})
+        self.assertEqual([call.kwargs["upsert"] for call in collection.find_one_and_update.call_args_list], [True, False])
+        refresh_overall.assert_called_once()
+
+    def test_player_already_on_the_board(self):
+        collection, refresh_overall = self.record(DuplicateKeyError("day"), None)
+        self.assertEqual(collection.find_one_and_update.call_count, 2)
+        refresh_overall.assert_not_called()
+
+    def test_too_slow_for_the_board(self):
+        _, refresh_overall = self.record({"one_star": [{"player": str(i)} for i in range(10, 20)]})
+        refresh_overall.assert_not_called()
+
+class FirstVisitTests(SimpleTestCase):
+    def test_later_day_opened_first_leaves_the_user_alone(self):
+        collections = {}
+        def collection(model):
+            return collections.setdefault(model, mock.AsyncMock())
+        async def upsert(query, update, **kwargs):
+            return {**query, **update["$setOnInsert"]}
+
+        with mock.patch.object(views.async_db, "collection", side_effect=collection):
+            collection(views.Problem).find_one_and_update.side_effect = upsert
+            problem = asyncio.run(views.start_problem("7", 3, 1))
+        self.assertEqual((problem.day, problem.part, problem.correct), (3, 1, False))
+        self.assertEqual(list(collections), [views.Problem])
+
+    def test_login_only_sets_profile_fields(self):
+        # a user document written by older versions, with days skipped in problems
+        github = {"id": 7, "name": None, "login": "seven", "html_url": "https://github.com/seven", "avatar_url": "https://avatars/7"}
+        request = RequestFactory().get("/callback", {"code": "abc"})
+        request.session = {}
+        users = mock.Mock()
+        users.find_one_and_update.return_value = {"_id": "existing", "problems": [None, None, ["id"]]}
+        with mock.patch("requests.post") as post, mock.patch("requests.get") as get, \
+                mock.patch.object(views.User, "_get_collection", return_value=users), mock.patch.object(views.profiles, "remember"):
+            post.return_value.json.return_value = {"access_token": "token"}
+            get.return_value.json.return_value = github
+            response = views.github_callback(request)
+
+        self.assertEqual(response.status_code, 302)
+        query, update = users.find_one_and_update.call_args.args
+        self.assertEqual(query, {"github_id": 7})
+        self.assertEqual(set(update["$set"]), {"username", "url", "avatar_url", "access_token"})
+        self.assertEqual(update["$set"]["username"], "seven")
+        self.assertEqual(request.session, {"user_id": "7", "username": "seven"})
+
+class RejudgeBatchTests(SimpleTestCase):
+    started = datetime(2025, 12, 3, 5)
+
+    def problem(self, player, part, correct, minutes=None):
+        submitted = self.started + timedelta(minutes=minutes) if minutes is not None else None
+        return {"_id": f"{player}-{part}", "player": player, "day": 3, "part": part, "code": "(f)", "correct": correct,
+                "time_started": self.started, "last_submission_time": submitted}
+
+    def rejudge(self, batch, verdicts, stored_part1=()):
+        problems, users = mock.Mock(), mock.Mock()
+        problems.find.return_value = list(stored_part1)
+        judged = iter(verdicts)
+        command = rejudge.Command(stdout=io.StringIO())
+        with mock.patch.object(rejudge.Problem, "_get_collection", return_value=problems), \
+                mock.patch.object(rejudge.User, "_get_collection", return_value=users), \
+                mock.patch.object(rejudge.problem_manager, "get_tests", return_value={}), \
+                mock.patch.object(rejudge, "validate_code", side_effect=lambda code, tests: next(judged)), \
+                mock.patch.object(command, "submitted_code", side_effect=lambda batch: [p["code"] for p in batch]):
+            counts = command.rejudge_batch(mock.Mock(map=map), batch, {}, dry_run=False)
+        written = {}
+        if problems.bulk_write.called:
+            written = {op._filter["_id"]: op._doc["$set"] for op in problems.bulk_write.call_args.args[0]}
+        return counts, written
+
+    def test_transient_failures_leave_the_star(self):
+        for message in judge_cache.TRANSIENT_MESSAGES:
+            with self.subTest(message=message):
+                counts, written = self.rejudge([self.problem("1", 1, True)], [(False, {"message": message, "results": []})])
+                self.assertEqual(counts, (0, 0, 1))
+                self.assertEqual(written, {})
+
+    def test_wrong_answer_loses_the_star(self):
+        counts, written = self.rejudge([self.problem("1", 1, True)], [(False, {"message": "1/2 passed", "results": ["1", "0"]})])
+        self.assertEqual(counts, (0, 1, 0))
+        self.assertFalse(written["1-1"]["correct"])
+
+    def test_both_parts_gained_in_one_batch(self):
+        batch = [self.problem("1", 1, False, minutes=10), self.problem("1", 2, False, minutes=25)]
+        passing = (True, {"message": "All tests passed!", "results": []})
+        counts, written = self.rejudge(batch, [passing, passing])
+        self.assertEqual(counts, (2, 0, 0))
+        self.assertEqual(written["1-1"]["time_taken"], 600 - views.TIME_TO_READ)
+        self.assertEqual(written["1-2"]["total_time"], 1500 - views.TIME_TO_READ + 600 - views.TIME_TO_READ)
+
+    def test_part2_uses_stored_part1_time(self):
+        counts, written = self.rejudge([self.problem("1", 2, False, minutes=5)], [(True, {"message": "All tests passed!"})],
+                                       stored_part1=[{"player": "1", "day": 3, "time_taken": 100}])
+        self.assertEqual(counts, (1, 0, 0))
+        self.assertEqual(written["1-2"]["total_time"], 300 - views.TIME_TO_READ + 100)
+
+    def test_untimed_solve_is_not_marked_correct(self):
+        counts, written = self.rejudge([self.problem("1", 2, False)], [(True, {"message": "All tests passed!"})])
+        self.assertEqual(counts, (0, 0, 1))
+        self.assertFalse(written["1-2"]["correct"])
+        self.assertNotIn("total_time", written["1-2"])
+
+class ShardDeadlineTests(SimpleTestCase):
+    def test_deadline_leaves_room_for_every_test_limit(self):
+        calls = ["(f 1)", "(f 2)", "(f 3)"]
+        with mock.patch.object(validate, "POOL_SIZE", 0), mock.patch.object(validate, "run_once", return_value=[]) as run_once:
+            validate.run_shard("", calls)
+        timeout = run_once.call_args.args[1]
+        self.assertLess(validate.TEST_TIME_LIMIT, validate.JUDGE_TIMEOUT)
+        self.assertGreaterEqual(timeout, validate.TEST_TIME_LIMIT * len(calls) + validate.JUDGE_TIMEOUT)
+
+class EnqueueTests(SimpleTestCase):
+    def test_admission_happens_outside_the_jobs_lock(self):
+        # the event loop takes jobs._lock directly, the shared admission file must not hold it up
+        def admit():
+            self.assertFalse(jobs._lock.locked())
+            return None
+        with mock.patch.object(jobs.admission, "admit", side_effect=admit), mock.patch.object(jobs, "_executor") as executor:
+            job = jobs.enqueue("player", ("player", 2, 1), lambda report: {})
+        executor.submit.assert_called_once()
+        self.assertIs(jobs.get_job(job.id), job)
+        with jobs._lock:
+            del jobs._jobs[job.id]
+
+class SubmitRefundTests(SimpleTestCase):
+    def submit(self, enqueued):
+        request = RequestFactory().post("/problem/3/1/submit", json.dumps({"code": "(f)"}), content_type="application/json")
+        request.session = {"user_id": "7"}
+        problems = mock.AsyncMock()
+        problems.find_one.return_value = {"_id": "p", "player": "7", "day": 3, "part": 1, "time_started": datetime(2025, 12, 3), "correct": False}
+        limits = {name: mock.AsyncMock() for name in ("aclaim_cooldown", "acount_submission", "arelease_cooldown", "arefund_submission")}
+        limits["acount_submission"].return_value = 42
+        with mock.patch.object(views, "require_login", return_value=(True, None)), \
+                mock.patch.object(views.async_db, "collection", return_value=problems), \
+                mock.patch.object(views.admission, "check"), \
+                mock.patch.multiple(views.ratelimit, **limits), \
+                mock.patch.object(views.jobs, "is_pending", return_value=False), \
+                mock.patch.object(views.jobs, "enqueue", side_effect=[enqueued]):
+            response = asyncio.run(views.submit(request, 3, 1))
+        return response, limits
+
+    def test_full_queue_refunds_the_submission(self):
+        response, limits = self.submit(admission.Overloaded(10))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "10")
+        limits["arelease_cooldown"].assert_awaited_once_with("7", 3, 1)
+        limits["arefund_submission"].assert_awaited_once_with("7", 42)
+
+    def test_pending_submission_refunds_the_submission(self):
+        response, limits = self.submit(None)
+        self.assertEqual(response.status_code, 429)
+        limits["arelease_cooldown"].assert_awaited_once_with("7", 3, 1)
+        limits["arefund_submission"].assert_awaited_once_with("7", 42)
@@ -6,8 +6,13 @@ urlpatterns = [
     path("", views.index, name="index"),
     path("problem/<int:day>/<int:part>", views.problem, name="problem"),
     path("problem/<int:day>/<int:part>/submit", views.submit, name="submit"),
+    path("problem/<int:day>/<int:part>/submit/<str:job_id>", views.submission_status, name="submission_status"),
+    path("problem/<int:day>/<int:part>/submit/<str:job_id>/stream", views.submission_stream, name="submission_stream"),
     path("leaderboard", views.leaderboard, name="leaderboard"),
     path("leaderboard/<int:day>", views.leaderboard, name="leaderboard"),
+    path("problem-manager/invalidate", views.invalidate_problem_cache, name="invalidate_problem_cache"),
+    path("metrics", views.prometheus_metrics, name="metrics"),
+    path("export/<str:dataset>", views.export_data, name="export"),
 
     path("login", views.github_login, name="github_login"),
     path("callback", views.github_callback, name="github_callback"),
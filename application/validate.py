@@ -1,67 +1,136 @@
-import random
 import os
-import subprocess, tempfile
-from pathlib import Path
-import platform
-
-# Construct the absolute path to the racket executable
-BASE_DIR = Path(__file__).resolve().parent.parent
-RACKET_ROOT = BASE_DIR / "RacketInstalls" / "racket"
-
-def add_sandbox(code):
-    safe_code = code.replace("\\", "\\\\").replace('"', '\\"')
-    return f"""
-    #lang racket
-        (require racket/sandbox)
-
-        (define run (make-evaluator 'racket "{safe_code}"))
-    """
-
-def add_tests(code, tests, delimiter):
-    public_tests = tests["public"]
-    hidden_tests = tests["hidden"]
+from concurrent.futures import ThreadPoolExecutor
+from . import metrics
+from .racket_pool import get_pool, run_once, JudgeTimeout, WorkerCrashed, POOL_SIZE, JUDGE_TIMEOUT
+
+JUDGE_SHARDS = int(os.getenv("JUDGE_SHARDS", min(os.cpu_count() or 1, max(POOL_SIZE, 1)))) # evaluators a large test suite is split across
+SHARD_MIN_TESTS = int(os.getenv("JUDGE_SHARD_MIN_TESTS", 8)) # smaller suites run in a single evaluator
+TEST_TIME_LIMIT = int(os.getenv("JUDGE_TEST_TIME_LIMIT", 5)) # seconds per test
+TEST_MEMORY_LIMIT = int(os.getenv("JUDGE_TEST_MEMORY_LIMIT", 20)) # MB per test
+MEMORY_LIMIT = int(os.getenv("JUDGE_MEMORY_LIMIT", 30)) # MB the evaluator may hold on to across all tests
+FAIL_FAST = os.getenv("JUDGE_FAIL_FAST", "1") == "1" # skip the hidden tests once a public test has failed
+
+def run_shard(code, calls, on_record=None, expected=None):
+    # code, context and tests go to the precompiled harness as one JSON payload, nothing is spliced into racket source
+    payload = {
+        "code": code,
+        "tests": calls,
+        "time_limit": TEST_TIME_LIMIT,
+        "memory_limit": TEST_MEMORY_LIMIT,
+        "total_memory_limit": MEMORY_LIMIT,
+    }
+    if expected:
+        # lets the harness skip the hidden tests after a public one fails
+        payload["expected"] = expected
+    # every test gets its full sandbox limit before the whole shard is given up on, JUDGE_TIMEOUT covers loading the code
+    timeout = JUDGE_TIMEOUT + TEST_TIME_LIMIT * len(calls)
+    try:
+        if POOL_SIZE > 0:
+            return get_pool().run(payload, timeout, on_record)
+        # cold start a fresh racket process for this submission
+        return run_once(payload, timeout, on_record)
+    except JudgeTimeout:
+        return [{"error": "timed out", "timeout": True}]
+    except WorkerCrashed:
+        return [{"error": "Unknown Error"}]
+
+def split_shards(calls):
+    if JUDGE_SHARDS < 2 or len(calls) < SHARD_MIN_TESTS:
+        return [calls]
+    size = -(-len(calls) // JUDGE_SHARDS)
+    return [calls[i:i + size] for i in range(0, len(calls), size)]
+
+def test_usage(record):
+    # what one test cost, as reported by the harness
+    memory = record.get("memory")
+    return {
+        "time_ms": round(record.get("time_ms", 0), 1),
+        "cpu_ms": record.get("cpu_ms", 0),
+        "memory_mb": round(memory / 2**20, 1) if memory is not None else None,
+    }
+
+def total_usage(tests, skipped=0, not_run=0):
+    # skipped counts the hidden tests whose results weren't used, not_run those the harness didn't run at all
+    memory = [test["memory_mb"] for test in tests if test["memory_mb"] is not None]
+    time_ms = sum(test["time_ms"] for test in tests)
+    return {
+        "time_ms": round(time_ms, 1),
+        "cpu_ms": sum(test["cpu_ms"] for test in tests),
+        "peak_memory_mb": max(memory, default=None),
+        "tests": tests,
+        "skipped_tests": skipped,
+        # tests that didn't run are assumed to take as long as the average test that did
+        "estimated_saved_ms": round(not_run * time_ms / len(tests), 1) if tests else 0,
+    }
+
+def shard_listener(offset, on_result):
+    # translates a shard's record index into the test's index in public + hidden order
+    if not on_result:
+        return None
+    def on_record(i, record):
+        if "output" in record:
+            on_result(offset + i, record["output"].strip(), test_usage(record))
+    return on_record
+
+def get_results(code, tests, on_result=None, fail_fast=FAIL_FAST):
+    # returns (success, outputs or error message, resource usage of the tests that ran). Once a public test has
+    # failed the outputs stop short of the hidden tests, their count is in the usage's skipped_tests. With fail_fast
+    # the harness doesn't run them at all
     func_name = tests.get("function_name")
-
-    for test in public_tests + hidden_tests:
-        code += f'\n(print "{delimiter}") (run "({func_name} {test[0]})")'
-
-    return code
-
-def get_results(code, delimiter):
-    with tempfile.NamedTemporaryFile(suffix=".rkt", mode="w+", delete=True) as temp_file:
-        temp_file.write(code)
-        temp_file.flush()
-
-        try:
-            run_env = os.environ.copy()
-            run_env["PLTCOLLECTS"] = str(RACKET_ROOT / "collects")
-
-            result = subprocess.run(
-                [str(RACKET_ROOT / "bin" / "racket"), temp_file.name],
-                capture_output=True,
-                text=True,
-                timeout=15,
-                env=run_env
-            )
-        except subprocess.TimeoutExpired:
-            return False, "Code execution timed out."
-
-    output = result.stdout.split(f'"{delimiter}"')[1:]
-    output = [out.strip() for out in output]
-
-    if result.stderr == "":
-        return True, output
-    else:
-        return False, "Your code crashed during execution\n" + result.stderr.encode("utf-8").splitlines()[0].decode("utf-8")
-
-def verify_tests(tests, output):
+    public_total = len(tests["public"])
+    calls = [f"({func_name} {test[0]})" for test in tests["public"] + tests["hidden"]]
+    expected = [test[1] for test in tests["public"]] + [None] * len(tests["hidden"]) if fail_fast else None
+
+    # contiguous shards run side by side in separate warm workers and are merged back in test order
+    shards = split_shards(calls)
+    offsets = [sum(len(shard) for shard in shards[:i]) for i in range(len(shards))]
+    def run(shard, offset):
+        shard_expected = expected[offset:offset + len(shard)] if expected else None
+        return run_shard(code, shard, shard_listener(offset, on_result), shard_expected)
+
+    # a shard holding only hidden tests can't see a public failure in another shard and runs in full
+    with metrics.timed("racket"):
+        if len(shards) == 1:
+            results = [run(calls, 0)]
+        else:
+            with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+                results = list(executor.map(run, shards, offsets))
+
+    output = []
+    usage = []
+    not_run = 0
+    public_failed = False
+    for records, offset in zip(results, offsets):
+        # one record per test, the harness stops after the first one that errors
+        for i, record in enumerate(records, offset):
+            if "skipped" in record:
+                not_run += record["skipped"]
+                public_failed = True
+                continue
+            if "time_ms" in record:
+                usage.append(test_usage(record))
+            if public_failed and i >= public_total:
+                # a hidden test run by a shard that couldn't see the public failure, a single evaluator
+                # would have skipped it, so neither its output nor its crash or timeout count
+                continue
+            if record.get("timeout"):
+                return False, "Code execution timed out.", total_usage(usage, not_run, not_run)
+            if "error" in record:
+                return False, "Your code crashed during execution\n" + record["error"], total_usage(usage, not_run, not_run)
+            output.append(record["output"].strip())
+            if i < public_total and output[-1] != tests["public"][i][1]:
+                public_failed = True
+    return True, output, total_usage(usage, len(calls) - len(output), not_run)
+
+def verify_tests(tests, output, skipped=0):
+    # when hidden tests were skipped a public test already failed, only the public outputs are needed
     results = []
     passed_public = 0
     passed_hidden = 0
     public_total = len(tests["public"])
     hidden_total = len(tests["hidden"])
 
-    if len(output) < public_total + hidden_total:
+    if len(output) < (public_total if skipped else public_total + hidden_total):
         print(output)
         return False, {"message": "Your code crashed during execution\nUnknown Error"}
 
@@ -73,6 +142,8 @@ def verify_tests(tests, output):
         results.append(output[i].strip() if i < len(output) else "No output")
 
     for i, test in enumerate(tests["hidden"]):
+        if public_total + i >= len(output):
+            break
         expected = test[1]
         actual = output[public_total + i]
         if expected == actual:
@@ -86,18 +157,22 @@ def verify_tests(tests, output):
     
     return False, {"message": f"All public tests pass\n{passed_hidden}/{hidden_total} hidden tests passed", "results": results}
 
-def validate_code(code, tests):
-    delimiter = f"*{random.random()}*"
-
+def validate_code(code, tests, on_result=None):
+    # on_result(index, output, usage) is called for each test as soon as it has run, possibly from several threads
     context = tests["context"] if "context" in tests else []
     for c in context:
         code += "\n" + c
 
-    code = add_sandbox(code)
-    code = add_tests(code, tests, delimiter)
-
-    success, output = get_results(code, delimiter)
+    success, output, usage = get_results(code, tests, on_result)
+    if success and usage["skipped_tests"] and all(expected == actual for (_, expected), actual in zip(tests["public"], output)):
+        # the harness trims output a little differently than python, judge everything rather than trust the skip
+        success, output, usage = get_results(code, tests, on_result, fail_fast=False)
+    metrics.JUDGE_CPU_SECONDS.observe(usage["cpu_ms"] / 1000)
+    metrics.SKIPPED_TESTS.inc(usage["skipped_tests"])
+    metrics.SAVED_SECONDS.inc(usage["estimated_saved_ms"] / 1000)
     if not success:
-        return False, {"message": output, "results": []}
+        return False, {"message": output, "results": [], "usage": usage}
     
-    return verify_tests(tests, output)
\ No newline at end of file
+    passed, tests_status = verify_tests(tests, output, usage["skipped_tests"])
+    tests_status["usage"] = usage
+    return passed, tests_status
\ No newline at end of file
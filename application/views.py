@@ -1,23 +1,33 @@
 import json
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import HttpResponse, HttpResponseRedirect, render, redirect
+from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django.views.decorators.csrf import csrf_exempt
 from django.core.paginator import Paginator
-from .models import User, Problem
-from .validate import validate_code
-import requests
+from asgiref.sync import sync_to_async
+from .models import User, Problem, progress_bit
+from . import admission, async_db, export, jobs, judge_cache, leaderboards, metrics, problem_manager, profiles, ratelimit
 from datetime import date, datetime, timedelta, timezone
 import os
-from dotenv import load_dotenv
 import traceback
-
-load_dotenv()
+import hashlib
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 TIME_TO_READ = 30 # seconds
 SUBMISSION_COOLDOWN = 15 # seconds between submissions
 HOURLY_RATE_LIMIT = 50 # max submissions per hour
-API_URL = "https://api.adventofracket.com" # "http://127.0.0.1:5000"
+FETCH_ERROR_CODES = {"tests": 1, "starter": 2, "md": 4}
+LEADERBOARD_MAX_AGE = 10 # seconds anonymous visitors and shared caches may reuse a leaderboard page
+SUBMISSION_STREAMING = os.getenv("SUBMISSION_STREAMING", "1") == "1" # push test results over server-sent events instead of polling
+STREAM_KEEPALIVE = 15 # seconds between keepalive comments on an idle stream
+PART_2_MARKER = "\n\n; --- PART 2 --- \n\n" # separates the part 1 solution from part 2 in the editor, only part 2 is stored
+
+_board_fragments = {} # ("day", day) or ("overall",) -> (board version, rendered html)
 
 def require_login(request):
     if not request.session.get("user_id"):
@@ -46,15 +56,20 @@ def index(request):
         return JsonResponse({"error": request.method + " not allowed here"}, status=400)
     
     new_user = request.session.get("new_user", False)
-    request.session["new_user"] = False
+    if new_user:
+        request.session["new_user"] = False
+    if "user_data" in request.session:
+        # left over from when the whole GitHub profile was kept in the session cookie
+        del request.session["user_data"]
     username = None
     user = None
     stars = [{"i": i, "open": day_available(i), "completion": 1} for i in range(1,26)]
     if request.session.get("user_id"):
-        user = User.objects(github_id=request.session.get("user_id")).first()
+        user = User.objects(github_id=request.session.get("user_id")).only("progress").as_pymongo().first()
+        progress = user.get("progress", 0) if user else 0
         # 1 if part1 next, 2 if part2 next, 3 if both done
-        for i in range(len(user.problems)):
-            stars[i]["completion"] = 1+sum([problem.correct for problem in user.problems[i]])
+        for star in stars:
+            star["completion"] = 1 + bin(progress >> (2 * (star["i"] - 1)) & 0b11).count("1")
     if request.session.get("user_id"):
         username = request.session.get("username")
     return render(request, "index.jekyll", {
@@ -64,67 +79,83 @@ def index(request):
     })
 
 def getDayLeaderboards(day):
-    two_stars_problems = Problem.objects(day=day, part=2, correct=True).order_by("total_time")[:10]
-    one_star_problems = Problem.objects(day=day, part=1, correct=True).order_by("time_taken")[:10]
-    lb_two_stars = []
-    lb_one_stars = []
-    for i, problem in enumerate(two_stars_problems):
-        player = User.objects(github_id=problem.player).first()
-        lb_two_stars.append({"rank": i+1, "name": player.username, "time": format_time(problem.total_time), "link": player.url})
-    for i, problem in enumerate(one_star_problems):
-        player = User.objects(github_id=problem.player).first()
-        lb_one_stars.append({"rank": i+1, "name": player.username, "time": format_time(problem.time_taken), "link": player.url})
-    
+    one_star, two_stars = leaderboards.get_day_leaderboards(day)
+    lb_two_stars = [{"rank": i+1, "name": entry.name, "time": format_time(entry.time), "link": entry.link} for i, entry in enumerate(two_stars)]
+    lb_one_stars = [{"rank": i+1, "name": entry.name, "time": format_time(entry.time), "link": entry.link} for i, entry in enumerate(one_star)]
     return lb_one_stars, lb_two_stars
 
 def calculateOverall():
-    playerList = {}
-    for i in range(1,26):
-        lb_one_stars, lb_two_stars = getDayLeaderboards(i)
-        for player in lb_one_stars + lb_two_stars:
-            if not player["link"] in playerList:
-                playerList[player["link"]] = {
-                    "score": 0,
-                    "name": player["name"]
-                }
-            ptsEarned = 10 - (player["rank"] - 1)
-            playerList[player["link"]]["score"] += ptsEarned
-    lb = [{"name": player["name"], "score": player["score"], "link": link} for link, player in playerList.items()]
-    lb.sort(key=lambda plr: plr["score"], reverse=True)
-    lb = [{"rank": i+1, "name": lb[i]["name"], "score": lb[i]["score"], "link": lb[i]["link"]} for i in range(min(20, len(lb)))]
-    return lb
+    lb = leaderboards.get_overall()
+    return [{"rank": i+1, "name": entry.name, "score": entry.score, "link": entry.link} for i, entry in enumerate(lb)]
+
+def cached_board(key, version, render_board):
+    # rendered board fragments are shared by every visitor until the board's version changes
+    cached = _board_fragments.get(key)
+    if cached and cached[0] == version:
+        return cached[1]
+    html = render_board()
+    _board_fragments[key] = (version, html)
+    return html
+
+def leaderboard_cache_headers(response, etag, last_modified, logged_in):
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified)
+    # logged in pages carry the username, so only the browser may keep them
+    response["Cache-Control"] = "private, no-cache" if logged_in else f"public, max-age={LEADERBOARD_MAX_AGE}"
+    return response
 
 def leaderboard(request, day=None):
     if request.method != "GET" and request.method != "HEAD":
         return JsonResponse({"error": request.method + " not allowed here"}, status=400)
     
+    if day != None and not day_available(day):
+        return HttpResponseRedirect(reverse("leaderboard"))
+
     days = [{"i": i, "open": day_available(i)} for i in range(1,26)]
 
     username = None
     if request.session.get("user_id"):
         username = request.session.get("username")
+
+    # the page changes when the board does, when another day opens, or when the viewer logs in or out
+    version, updated_at = leaderboards.board_version(day)
+    viewer = hashlib.sha1(username.encode("utf-8")).hexdigest()[:8] if username else "anonymous"
+    etag = quote_etag(f"lb-{day or 'overall'}-{version}-{sum(d['open'] for d in days)}-{viewer}")
+    last_modified = int(updated_at.timestamp()) if updated_at else None
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified:
+        return leaderboard_cache_headers(not_modified, etag, last_modified, bool(username))
+
+    if day != None:
+        def render_board():
+            lb_one_stars, lb_two_stars = getDayLeaderboards(day)
+            return render_to_string("leaderboard_day_board.jekyll", {
+                "selected_day": day,
+                "leaderboard_two_stars": lb_two_stars,
+                "leaderboard_one_star": lb_one_stars
+            })
+
+        with metrics.timed("render"):
+            response = render(request, "leaderboard_specific.jekyll", {
+                "username": username,
+                "days": days, "selected_day": day,
+                "board": cached_board(("day", day), version, render_board),
+            })
+        return leaderboard_cache_headers(response, etag, last_modified, bool(username))
     
-    if day != None and day_available(day):
-        lb_one_stars, lb_two_stars = getDayLeaderboards(day)
-        
-        return render(request, "leaderboard_specific.jekyll", {
+    def render_board():
+        return render_to_string("leaderboard_overall_board.jekyll", {"leaderboard_overall": calculateOverall()})
+
+    with metrics.timed("render"):
+        response = render(request, "leaderboard.jekyll", {
             "username": username,
-            "days": days, "selected_day": day,
-            "leaderboard_two_stars": lb_two_stars,
-            "leaderboard_one_star": lb_one_stars
+            "days": days,
+            "board": cached_board(("overall",), version, render_board),
         })
-    
-    if day != None and not day_available(day):
-        return HttpResponseRedirect(reverse("leaderboard"))
-    
-    leaderboard_overall = calculateOverall()
-    return render(request, "leaderboard.jekyll", {
-        "username": username,
-        "days": days,
-        "leaderboard_overall": leaderboard_overall
-    })
+    return leaderboard_cache_headers(response, etag, last_modified, bool(username))
 
-def problem(request, day, part=1):
+async def problem(request, day, part=1):
     if request.method != "GET":
         return JsonResponse({"error": request.method + " not allowed here"}, status=400)
     
@@ -138,63 +169,25 @@ def problem(request, day, part=1):
     if not day_available(day):
         return HttpResponseRedirect(reverse("index"))
     
-    # check if completed
-    started_problem = Problem.objects(player=user_id, day=day, part=part).first()
-    
-    # fetch test cases
-    test_cases = ""
+    # fetch test cases, starter code and problem description
     try:
-        response = requests.get(f"{API_URL}/tests/{day}/{part}",
-                                headers={"X-Authorization": f"Bearer {os.getenv('AOR_MANAGER_ACCESS_TOKEN')}"})
-        response.raise_for_status()
-        test_cases = json.loads(response.text)
-    except requests.exceptions.RequestException as e:
+        with metrics.timed("fetch"):
+            test_cases, starter_code, description = await sync_to_async(problem_manager.fetch_problem, thread_sensitive=False)(day, part)
+    except problem_manager.FetchError as e:
         traceback.print_exc()
-        print(f"Error fetching test cases: {e}")
-        return HttpResponse("Fetch Error 1", status=500)
+        print(f"Error fetching {e.resource}: {e}")
+        return HttpResponse(f"Fetch Error {FETCH_ERROR_CODES[e.resource]}", status=500)
 
-    # fetch starter code
-    starter_code = ""
-    try:
-        response = requests.get(f"{API_URL}/starter/{day}/{part}",
-                                headers={"X-Authorization": f"Bearer {os.getenv('AOR_MANAGER_ACCESS_TOKEN')}"})
-        response.raise_for_status()
-        starter_code = response.text
-    except requests.exceptions.RequestException as e:
-        traceback.print_exc()
-        print(f"Error fetching starter code: {e}")
-        return HttpResponse("Fetch Error 2", status=500)
-    
-    # fetch problem description
-    description = ""
-    try:
-        response = requests.get(f"{API_URL}/md/{day}/{part}",
-                                headers={"X-Authorization": f"Bearer {os.getenv('AOR_MANAGER_ACCESS_TOKEN')}"})
-        response.raise_for_status()
-        description = response.text
-    except requests.exceptions.RequestException as e:
-        traceback.print_exc()
-        print(f"Error fetching problem description: {e}")
-        return HttpResponse("Fetch Error 4", status=500)
-
-    if started_problem and started_problem.code:
+    # check if completed, creating a new problem entry if not started
+    started_problem = await start_problem(user_id, day, part)
+    if started_problem.code:
         starter_code = started_problem.code
-    elif not started_problem:
-        # create a new problem entry if not started
-        new_problem = Problem(player=user_id, day=day, part=part, time_started=datetime.now())
-        new_problem.save()
-        user = User.objects(github_id=request.session.get("user_id")).first()
-        if len(user.problems) < day:
-            user.problems.extend([[]] * (day - len(user.problems)))
-        user.problems[day-1].append(new_problem)
-        user.save()
-        started_problem = new_problem
     if part != 1:
-        previous_problem = Problem.objects(player=user_id, day=day, part=1, correct=True).first()
+        previous_problem = await async_db.collection(Problem).find_one({"player": user_id, "day": day, "part": 1, "correct": True}, {"code": 1})
         if not previous_problem:
             # redirect to part 1 if not completed
             return HttpResponseRedirect(reverse("problem", args=[day, 1]))
-        starter_code = previous_problem.code + "\n\n; --- PART 2 --- \n\n" + starter_code
+        starter_code = (previous_problem.get("code") or "") + PART_2_MARKER + starter_code
 
 
     for i in range(len(test_cases["public"])):
@@ -203,26 +196,51 @@ def problem(request, day, part=1):
             test_cases["public"][i] = {"input": test[0], "expected": test[1], "output": started_problem.tests[i]}
         else:
             test_cases["public"][i] = {"input": test[0], "expected": test[1]}
+    add_timings(test_cases["public"], started_problem.usage)
 
     is_completed = started_problem.correct if started_problem else False
 
-    return render(request, "problem.jekyll", {
-        "selected_day": day,
-        "selected_part": part,
-        "starter_code": starter_code,
-        "username": username,
-        "is_completed": is_completed,
-        "time_taken": started_problem.time_taken if is_completed else False,
-        "time_started": started_problem.time_started.timestamp() + TIME_TO_READ,
-        "description": description,
-
-        "tests": render(request, "tests.jekyll", {
-            "test_cases": test_cases["public"],
-            "tests_message": started_problem.tests_message if started_problem and started_problem.tests_message and len(started_problem.tests_message) > 0 else None,
-        }).content.decode('utf-8'),
-    })
+    with metrics.timed("render"):
+        return render(request, "problem.jekyll", {
+            "selected_day": day,
+            "selected_part": part,
+            "starter_code": starter_code,
+            "username": username,
+            "is_completed": is_completed,
+            "time_taken": started_problem.time_taken if is_completed else False,
+            "time_started": started_problem.time_started.timestamp() + TIME_TO_READ,
+            "description": description,
+
+            "tests": render(request, "tests.jekyll", {
+                "test_cases": test_cases["public"],
+                "usage": started_problem.usage,
+                "tests_message": started_problem.tests_message if started_problem and started_problem.tests_message and len(started_problem.tests_message) > 0 else None,
+            }).content.decode('utf-8'),
+        })
 
-def submit(request, day, part=1):
+def add_timings(tests, usage):
+    # wall time of each public test in the last judge run, shown next to its result
+    for test, timing in zip(tests, (usage or {}).get("tests", [])):
+        test["time_ms"] = timing["time_ms"]
+
+async def start_problem(user_id, day, part):
+    # finds or creates the player's problem in one upsert, the unique (player, day, part) index stops duplicates
+    new_id = ObjectId()
+    async def upsert():
+        return await async_db.collection(Problem).find_one_and_update(
+            {"player": user_id, "day": day, "part": part},
+            {"$setOnInsert": {"_id": new_id, "time_started": datetime.now(), "correct": False}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    try:
+        doc = await upsert()
+    except DuplicateKeyError:
+        # lost a race with a concurrent first visit, the document exists now
+        doc = await upsert()
+    return Problem._from_son(doc)
+
+async def submit(request, day, part=1):
     if request.method != "POST":
         return JsonResponse({"error": request.method + " not allowed here"}, status=400)
     
@@ -231,61 +249,93 @@ def submit(request, day, part=1):
         return redirect_url
     
     user_id = request.session.get("user_id")
-    user = User.objects(github_id=user_id).first()
 
-    problem = Problem.objects(player=user_id, day=day, part=part).first()
+    problem = await async_db.collection(Problem).find_one({"player": user_id, "day": day, "part": part})
     if not problem:
         return JsonResponse({"error": "Problem not started yet"}, status=400)
+    problem = Problem._from_son(problem)
     if problem.correct:
         return JsonResponse({"error": "Problem already completed"}, status=400)
+    if jobs.is_pending((user_id, day, part)):
+        return JsonResponse({"error": "Your previous submission is still running"}, status=429)
 
-    # per-problem cooldown check
-    if problem.last_submission_time:
-        time_since_last_submission = (datetime.now() - problem.last_submission_time).total_seconds()
-        if time_since_last_submission < SUBMISSION_COOLDOWN:
-            remaining_time = int(SUBMISSION_COOLDOWN - time_since_last_submission)
-            return JsonResponse({"error": f"Please wait {remaining_time} seconds before submitting again"}, status=429)
+    code = json.loads(request.body).get("code", "")
+
+    # shed load before anything is counted against the player, the judge is shared by every server process
+    try:
+        await sync_to_async(admission.check, thread_sensitive=False)()
+    except admission.Overloaded as e:
+        return overloaded(e)
+
+    # per-problem cooldown and hourly rate limit checks
+    try:
+        await ratelimit.aclaim_cooldown(user_id, day, part, SUBMISSION_COOLDOWN)
+    except ratelimit.RateLimited as e:
+        return JsonResponse({"error": str(e)}, status=429)
+    try:
+        bucket = await ratelimit.acount_submission(user_id, HOURLY_RATE_LIMIT)
+    except ratelimit.RateLimited as e:
+        await ratelimit.arelease_cooldown(user_id, day, part)
+        return JsonResponse({"error": str(e)}, status=429)
 
-    # hourly rate limit check
     current_time = datetime.now()
-    one_hour_ago = current_time.timestamp() - 3600
-
-    if user.submission_history:
-        recent_submissions = [ts for ts in user.submission_history if ts.timestamp() > one_hour_ago]
-        user.submission_history = recent_submissions
-
-        if len(recent_submissions) >= HOURLY_RATE_LIMIT:
-            # find the oldest submission in the window
-            oldest_submission = min(recent_submissions, key=lambda ts: ts.timestamp())
-            time_until_available = int(3600 - (current_time.timestamp() - oldest_submission.timestamp()))
-            minutes = time_until_available // 60
-            seconds = time_until_available % 60
-            return JsonResponse({"error": f"Hourly submission limit reached. Try again in {minutes:02d}m {seconds:02d}s"}, status=429)
-
-    # add submission to history
-    problem.last_submission_time = current_time
-    if not user.submission_history:
-        user.submission_history = []
-    user.submission_history.append(current_time)
+    await async_db.collection(Problem).update_one({"_id": problem.id}, {"$set": {"last_submission_time": current_time}})
+
+    # the judge ticket is taken here, so nothing between the check above and the job can leak it
+    try:
+        job = await sync_to_async(jobs.enqueue, thread_sensitive=False)(user_id, (user_id, day, part), judge_submission, problem, code, current_time)
+    except admission.Overloaded as e:
+        # the queue filled up since the check, the submission wasn't taken so it doesn't count
+        await ratelimit.arelease_cooldown(user_id, day, part)
+        await ratelimit.arefund_submission(user_id, bucket)
+        return overloaded(e)
+    if not job:
+        # another submission for this problem got in since the check
+        await ratelimit.arelease_cooldown(user_id, day, part)
+        await ratelimit.arefund_submission(user_id, bucket)
+        return JsonResponse({"error": "Your previous submission is still running"}, status=429)
+    queue_stats = jobs.stats()
+    return JsonResponse({"job_id": job.id, "queue_depth": queue_stats["queue_depth"], "stream": SUBMISSION_STREAMING}, status=202)
+
+def overloaded(error):
+    response = JsonResponse({"error": str(error)}, status=503)
+    response["Retry-After"] = str(error.retry_after)
+    return response
+
+def judge_submission(problem, code, submitted_at, report=None):
+    # runs on a judge worker thread, returns the payload sent back to the polling client
+    # and reports each public test's rendered result as soon as it has run
+    import requests
+    day = problem.day
+    part = problem.part
 
-    code = json.loads(request.body).get("code", "")
-    
     # fetch test cases
     test_cases = {"public": [], "private": []}
     try:
-        response = requests.get(f"{API_URL}/tests/{day}/{part}",
-                                headers={"X-Authorization": f"Bearer {os.getenv('AOR_MANAGER_ACCESS_TOKEN')}"})
-        response.raise_for_status()
-        test_cases = json.loads(response.text)
+        with metrics.timed("fetch"):
+            test_cases = problem_manager.get_tests(day, part)
     except requests.exceptions.RequestException as e:
         traceback.print_exc()
         print(f"Error fetching test cases: {e}")
-        return HttpResponse("Fetch Error 3", status=500)
+        return {"error": "Fetch Error 3"}
     
-    passed, tests_status = validate_code(code, test_cases)
-    problem.code = code if "\n\n; --- PART 2 --- \n\n" not in code else code.split("\n\n; --- PART 2 --- \n\n")[1]
+    public_tests = list(test_cases["public"])
+    def on_result(i, output, usage):
+        if report and i < len(public_tests):
+            test = {"input": public_tests[i][0], "expected": public_tests[i][1], "output": output, "time_ms": usage["time_ms"]}
+            report("test", {"index": i, "html": render_to_string("test_case.jekyll", {"test": test})})
+
+    passed, tests_status = judge_cache.validate_code_cached(code, test_cases, day, part, on_result)
+    problem.code = code if PART_2_MARKER not in code else code.split(PART_2_MARKER)[1]
     problem.tests = tests_status.get("results", [])
     problem.tests_message = tests_status.get("message", "Unknown error")
+    problem.usage = tests_status.get("usage", {})
+    updates = {
+        "set__code": problem.code,
+        "set__tests": problem.tests,
+        "set__tests_message": problem.tests_message,
+        "set__usage": problem.usage,
+    }
 
     for i in range(len(test_cases["public"])):
         test = test_cases["public"][i]
@@ -293,25 +343,148 @@ def submit(request, day, part=1):
             test_cases["public"][i] = {"input": test[0], "expected": test[1], "output": problem.tests[i]}
         else:
             test_cases["public"][i] = {"input": test[0], "expected": test[1]}
+    add_timings(test_cases["public"], problem.usage)
 
-    tests_html = render(request, "tests.jekyll", {
+    tests_html = render_to_string("tests.jekyll", {
         "test_cases": test_cases["public"],
+        "usage": problem.usage,
         "tests_message": problem.tests_message if problem and problem.tests_message and len(problem.tests_message) > 0 else None,
-    }).content.decode('utf-8')
+    })
 
     if passed:
         problem.correct = True
-        problem.time_taken = -TIME_TO_READ + int(datetime.now().timestamp() - problem.time_started.timestamp())
+        problem.time_taken = -TIME_TO_READ + int(submitted_at.timestamp() - problem.time_started.timestamp())
         if problem.time_taken < 0:
-            return JsonResponse({"error": "Please read the problem"}, status=400)
+            return {"error": "Please read the problem"}
+        updates["set__correct"] = True
+        updates["set__time_taken"] = problem.time_taken
         if part == 2:
-            part1_problem = Problem.objects(player=user_id, day=day, part=1).first()
+            part1_problem = Problem.objects(player=problem.player, day=day, part=1).only("time_taken").first()
             problem.total_time = problem.time_taken + part1_problem.time_taken
-    user.save()
-    problem.save()
-    return JsonResponse({"success": passed, "tests_html": tests_html}, status=200)
+            updates["set__total_time"] = problem.total_time
+
+    # only the fields this run changed, and never on top of an already solved problem
+    updated = Problem.objects(id=problem.id, correct=False).update_one(**updates)
+    if passed and updated:
+        User.objects(github_id=problem.player).update_one(__raw__={"$bit": {"progress": {"or": progress_bit(day, part)}}})
+        leaderboards.record_solve(problem, profiles.get_profile(problem.player))
+    return {"success": passed, "tests_html": tests_html}
+
+def submission_status(request, day, part, job_id):
+    if request.method != "GET":
+        return JsonResponse({"error": request.method + " not allowed here"}, status=400)
+
+    is_logged_in, redirect_url = require_login(request)
+    if not is_logged_in:
+        return redirect_url
+
+    job = jobs.get_job(job_id)
+    if not job or job.owner != request.session.get("user_id") or job.key[1:] != (day, part):
+        return JsonResponse({"error": "Submission not found"}, status=404)
+
+    if job.status != "done":
+        return JsonResponse({
+            "status": job.status,
+            "queue_position": jobs.queue_position(job),
+            "wait_time": round(job.wait_time(), 2),
+        }, status=200)
+    return JsonResponse({"status": job.status, "wait_time": round(job.wait_time(), 2), **job.result}, status=200)
+
+async def submission_stream(request, day, part, job_id):
+    if request.method != "GET":
+        return JsonResponse({"error": request.method + " not allowed here"}, status=400)
+
+    is_logged_in, redirect_url = require_login(request)
+    if not is_logged_in:
+        return redirect_url
+
+    job = jobs.get_job(job_id)
+    if not job or job.owner != request.session.get("user_id") or job.key[1:] != (day, part):
+        return JsonResponse({"error": "Submission not found"}, status=404)
+
+    async def events():
+        # replays everything published so far, then follows the job until it is done
+        sent = 0
+        while True:
+            new_events = await jobs.wait_for_events(job, sent, STREAM_KEEPALIVE)
+            if not new_events:
+                yield ": keepalive\n\n"
+                continue
+            for event, data in new_events:
+                if event == "done":
+                    data = {"status": job.status, "wait_time": round(job.wait_time(), 2), **data}
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+                if event == "done":
+                    return
+            sent += len(new_events)
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no" # keep proxies from holding events back
+    return response
     
 
+@csrf_exempt
+def invalidate_problem_cache(request):
+    # called by the Problem Manager after problem content changes
+    if request.method != "POST":
+        return JsonResponse({"error": request.method + " not allowed here"}, status=400)
+    if request.headers.get("X-Authorization") != f"Bearer {os.getenv('AOR_MANAGER_ACCESS_TOKEN')}":
+        return JsonResponse({"error": "Unauthorized"}, status=401)
+
+    body = json.loads(request.body) if request.body else {}
+    problem_manager.invalidate(body.get("day"), body.get("part"), body.get("resource"))
+    if body.get("resource") in (None, "tests"):
+        judge_cache.invalidate(body.get("day"), body.get("part"))
+    return JsonResponse({"success": True}, status=200)
+
+def is_admin(request):
+    admins = {github_id.strip() for github_id in os.getenv("ADMIN_GITHUB_IDS", "").split(",") if github_id.strip()}
+    return request.session.get("user_id") in admins
+
+async def stream_chunks(chunks):
+    # under ASGI a sync iterator is read to the end before anything is sent, so pull it one chunk at a time from a thread
+    done = object()
+    while True:
+        chunk = await sync_to_async(next, thread_sensitive=False)(chunks, done)
+        if chunk is done:
+            return
+        yield chunk
+
+def export_data(request, dataset):
+    # organizers only, lists the ADMIN_GITHUB_IDS users may download everything
+    if request.method != "GET":
+        return JsonResponse({"error": request.method + " not allowed here"}, status=400)
+
+    is_logged_in, redirect_url = require_login(request)
+    if not is_logged_in:
+        return redirect_url
+    if not is_admin(request):
+        return JsonResponse({"error": "Forbidden"}, status=403)
+
+    format = request.GET.get("format", "ndjson")
+    if dataset not in export.DATASETS or format not in export.FORMATS:
+        return JsonResponse({"error": "Unknown export"}, status=404)
+    try:
+        day = int(request.GET["day"]) if request.GET.get("day") else None
+        part = int(request.GET["part"]) if request.GET.get("part") else None
+    except ValueError:
+        return JsonResponse({"error": "day and part must be numbers"}, status=400)
+
+    chunks = export.chunks(export.lines(dataset, format, day, part))
+    response = StreamingHttpResponse(stream_chunks(chunks), content_type=export.FORMATS[format])
+    response["Content-Disposition"] = f'attachment; filename="{dataset}.{format}"'
+    return response
+
+def prometheus_metrics(request):
+    # Prometheus scrape endpoint, guarded by METRICS_TOKEN when it is set
+    if request.method != "GET":
+        return JsonResponse({"error": request.method + " not allowed here"}, status=400)
+    token = os.getenv("METRICS_TOKEN")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return JsonResponse({"error": "Unauthorized"}, status=401)
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
 # GitHub OAuth
 
 def github_login(request):
@@ -321,6 +494,7 @@ def github_login(request):
     return redirect(github_auth_url)
 
 def github_callback(request):
+    import requests
     code = request.GET.get("code")
 
     token_response = requests.post(
@@ -340,23 +514,27 @@ def github_callback(request):
     )
     user_data = user_response.json()
 
-    github_id = str(user_data["id"])
-    user = User.objects(github_id=github_id).first()
-
-    if not user:
-        user = User(github_id=github_id, created_at=datetime.now())
+    github_id = int(user_data["id"])
+    profile = {
+        "username": user_data["name"] if user_data["name"] else user_data["login"],
+        "url": user_data["html_url"],
+        "avatar_url": user_data["avatar_url"],
+        "access_token": access_token,
+    }
+    # only the profile fields are written, the rest of the user document is left as it is
+    existing = User._get_collection().find_one_and_update(
+        {"github_id": github_id},
+        {"$set": profile, "$setOnInsert": {"created_at": datetime.now(), "progress": 0}},
+        projection={"_id": 1},
+        upsert=True,
+    )
+    if not existing:
         request.session["new_user"] = True
 
-    user.username = user_data["name"] if user_data["name"] else user_data["login"]
-    user.url = user_data["html_url"]
-    user.avatar_url = user_data["avatar_url"]
-    user.access_token = access_token
-    user.save()
-
-    # store login in session
-    request.session["user_id"] = str(user.github_id)
-    request.session["username"] = user.username
-    request.session["user_data"] = user_data
+    # the session cookie only holds the id and display name, the rest of the profile is cached server side
+    request.session["user_id"] = str(github_id)
+    request.session["username"] = profile["username"]
+    profiles.remember(github_id, profiles.Profile(profile["username"], profile["url"], profile["avatar_url"]))
 
     return redirect("/")
 
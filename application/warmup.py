@@ -0,0 +1,25 @@
+import threading
+import time
+import traceback
+
+from mongoengine.connection import get_db
+from pymongo.errors import PyMongoError
+
+from . import problem_manager
+from .racket_pool import POOL_SIZE, get_pool
+
+def warm_up():
+    # opens what the first requests would otherwise open themselves. Runs in the background
+    # so the worker starts accepting connections straight away
+    threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+
+def _warm_up():
+    start = time.perf_counter()
+    try:
+        get_db().command("ping")
+    except PyMongoError:
+        traceback.print_exc()
+    if POOL_SIZE > 0:
+        get_pool()
+    problem_manager.get_session()
+    print(f"Warmed up in {(time.perf_counter() - start) * 1000:.0f} ms")
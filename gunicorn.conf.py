@@ -0,0 +1,21 @@
+# gunicorn settings, picked up automatically from the working directory:
+#   gunicorn AdventOfRacket.asgi:application
+# Views run on uvicorn's event loop, so one worker holds many in-flight requests at once.
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# submission jobs, their event streams and the warm racket pool live in the worker process,
+# keep a single worker unless those move out of process
+workers = int(os.getenv("WEB_CONCURRENCY", 1))
+
+# streams send a keepalive every 15 seconds, anything quieter than this is stuck
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5
+
+def post_worker_init(worker):
+    # MongoDB and the racket pool are opened lazily, start on them before the first visitor needs them
+    from application.warmup import warm_up
+    warm_up()